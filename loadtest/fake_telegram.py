@@ -0,0 +1,197 @@
+import time
+import asyncio
+import itertools
+
+from typing import Any
+from aiohttp import web
+from collections import defaultdict
+
+# Бот сохраняет фото как <file_id>.jpg, по префиксу их находит очистка
+FILE_PREFIX = "loadtest-photo"
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Ramochka",
+    "username": "ramochka_load_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+class FakeTelegramServer:
+    """Минимальный Bot API для python-telegram-bot.
+
+    Бот подключается через Application.builder().base_url(...):
+    запросы приходят на /bot<token>/<method>, файлы скачиваются с
+    /file/bot<token>/<file_path>. Входящие сообщения чатов отдаются
+    через getUpdates, ответы бота складываются в очередь чата.
+    """
+
+    def __init__(self):
+        self.updates: list[dict] = []
+        self.files: dict[str, bytes] = {}
+        self.inboxes: dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.bot_connected = asyncio.Event()
+        self._new_update = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+        self.methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "sendMessage": self.send_message,
+            "sendPhoto": self.send_photo,
+            "getFile": self.get_file,
+        }
+
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        self.app.router.add_get("/file/bot{token}/{file_path:.+}", self.handle_file)
+
+    # Действия пользователей
+
+    def _user_message(self, chat_id: int, **fields) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+            **fields,
+        }
+
+    def _push_update(self, message: dict) -> None:
+        self.updates.append({"update_id": next(self._update_ids), "message": message})
+        self._new_update.set()
+
+    def user_command(self, chat_id: int, text: str) -> None:
+        """Команда пользователя, например /delete <id>"""
+        command = text.split()[0]
+        self._push_update(
+            self._user_message(
+                chat_id,
+                text=text,
+                entities=[{"type": "bot_command", "offset": 0, "length": len(command)}],
+            )
+        )
+
+    def user_photo(self, chat_id: int, data: bytes, size: tuple[int, int]) -> str:
+        """Фото от пользователя. Возвращает file_id"""
+        file_id = f"{FILE_PREFIX}{next(self._file_ids)}_{chat_id}"
+        self.files[file_id] = data
+        width, height = size
+        self._push_update(
+            self._user_message(
+                chat_id,
+                photo=[
+                    {
+                        "file_id": file_id,
+                        "file_unique_id": file_id,
+                        "width": width,
+                        "height": height,
+                        "file_size": len(data),
+                    }
+                ],
+            )
+        )
+        return file_id
+
+    # Bot API
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        # В multipart-запросах бывают файлы (web.FileField), а не только строки
+        params: dict[str, Any] = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.can_read_body:
+            params.update(await request.post())
+
+        handler = self.methods.get(request.match_info["method"])
+        # deleteWebhook, setMyCommands и прочее просто подтверждаем
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_path"].rsplit("/", 1)[-1].split(".")[0]
+        data = self.files.pop(file_id, None)
+        if data is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=data, content_type="image/jpeg")
+
+    async def get_me(self, params: dict) -> dict:
+        return BOT_USER
+
+    async def get_updates(self, params: dict) -> list[dict]:
+        self.bot_connected.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Всё до offset бот уже получил
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return self.updates[:limit]
+
+    def _bot_message(self, params: dict, **fields) -> dict:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **fields,
+        }
+        self.inboxes[chat_id].put_nowait((time.perf_counter(), message))
+        return message
+
+    async def send_message(self, params: dict) -> dict:
+        return self._bot_message(params, text=params.get("text", ""))
+
+    async def send_photo(self, params: dict) -> dict:
+        photo = params.get("photo")
+        size = len(photo.file.read()) if isinstance(photo, web.FileField) else 0
+        file_id = f"sent{next(self._file_ids)}"
+        return self._bot_message(
+            params,
+            photo=[
+                {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "width": 500,
+                    "height": 700,
+                    "file_size": size,
+                }
+            ],
+        )
+
+    async def get_file(self, params: dict) -> dict:
+        file_id = params["file_id"]
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": len(self.files.get(file_id, b"")),
+            "file_path": f"photos/{file_id}.jpg",
+        }
+
+    def release_polls(self) -> None:
+        """Ответить на ожидающие getUpdates, чтобы сервер остановился сразу"""
+        self._new_update.set()
+
+    async def receive(self, chat_id: int, timeout: float) -> tuple[float, dict]:
+        """Следующее сообщение бота в чат: (момент получения, сообщение)"""
+        return await asyncio.wait_for(self.inboxes[chat_id].get(), timeout)
+
+    def clear_inbox(self, chat_id: int) -> None:
+        """Сброс опоздавших ответов на прошлые действия"""
+        inbox = self.inboxes[chat_id]
+        while not inbox.empty():
+            inbox.get_nowait()
+
@@ -0,0 +1,152 @@
+import io
+import time
+import hashlib
+import uuid
+import random
+import asyncio
+
+from PIL import Image, ImageDraw
+from pathlib import Path
+from stats import LatencyStats
+
+FILE_PREFIX = "loadtest-file"
+
+
+def make_image(width: int, height: int) -> bytes:
+    """JPEG со случайными прямоугольниками: у каждого файла свой hash"""
+    image = Image.new("RGB", (width, height), tuple(random.choices(range(256), k=3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(20):
+        x, y = random.randrange(width), random.randrange(height)
+        w, h = random.randrange(width // 2), random.randrange(height // 2)
+        draw.rectangle(
+            (x, y, x + w, y + h),
+            fill=tuple(random.choices(range(256), k=3)),
+        )
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class OutputWatcher:
+    """Ожидание результатов в OUTPUT_PATH.
+
+    Для каждого ожидаемого файла запоминается момент, с которого считать
+    задержку. Папка опрашивается по именам, а не целиком: в ней может быть
+    вся библиотека.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        stats: LatencyStats,
+        timeout: float,
+        poll_interval: float = 0.05,
+    ):
+        self.output_dir = output_dir
+        self.stats = stats
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.pending: dict[str, tuple[str, float]] = {}
+
+    def expect(self, name: str, metric: str, started: float) -> None:
+        self.pending[name] = (metric, started)
+
+    async def run(self) -> None:
+        while True:
+            now = time.perf_counter()
+            for name, (metric, started) in list(self.pending.items()):
+                if (self.output_dir / name).exists():
+                    self.stats.record(metric, now - started)
+                    del self.pending[name]
+                elif now - started > self.timeout:
+                    self.stats.error(metric)
+                    del self.pending[name]
+            await asyncio.sleep(self.poll_interval)
+
+    async def drain(self, timeout: float) -> None:
+        """Дождаться оставшихся результатов (или их таймаута)"""
+        deadline = time.perf_counter() + timeout
+        while self.pending and time.perf_counter() < deadline:
+            await asyncio.sleep(self.poll_interval)
+
+
+class FileDropGenerator:
+    """Создание и удаление изображений в папке, за которой следит watcher"""
+
+    METRIC = "файл → результат"
+
+    def __init__(
+        self,
+        watch_dir: Path,
+        outputs: OutputWatcher,
+        own_hashes: set[str],
+        create_rate: float,
+        delete_rate: float,
+        size: tuple[int, int],
+    ):
+        self.watch_dir = watch_dir
+        self.own_hashes = own_hashes
+        self.outputs = outputs
+        self.create_rate = create_rate
+        self.delete_rate = delete_rate
+        self.size = size
+        self.created: list[Path] = []
+        self.created_total = 0
+        self.deleted = 0
+
+    async def run_creates(self) -> None:
+        next_at = time.perf_counter()
+        while True:
+            # Пуассоновский поток: интервалы распределены экспоненциально.
+            # Расписание не сдвигается на время генерации изображения
+            next_at += random.expovariate(self.create_rate)
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            data = await asyncio.to_thread(make_image, *self.size)
+            path = self.watch_dir / f"{FILE_PREFIX}-{uuid.uuid4().hex}.jpg"
+            self.own_hashes.add(hashlib.md5(data).hexdigest())
+
+            started = time.perf_counter()
+            # watcher узнаёт о файле при открытии, а не после записи. Пишем
+            # под именем, которое он пропускает, и переименовываем готовый
+            tmp_path = path.with_suffix(".part")
+            await asyncio.to_thread(tmp_path.write_bytes, data)
+            await asyncio.to_thread(tmp_path.replace, path)
+            self.created.append(path)
+            self.created_total += 1
+            self.outputs.expect(path.name, self.METRIC, started)
+
+    async def run_deletes(self) -> None:
+        while True:
+            await asyncio.sleep(random.expovariate(self.delete_rate))
+            # Удаляем только уже обработанные, иначе watcher ещё читает файл
+            processed = [
+                path for path in self.created if path.name not in self.outputs.pending
+            ]
+            if not processed:
+                continue
+
+            path = random.choice(processed)
+            self.created.remove(path)
+            path.unlink(missing_ok=True)
+            self.deleted += 1
+
+    def tasks(self) -> list:
+        tasks = []
+        if self.create_rate > 0:
+            tasks.append(self.run_creates())
+        if self.delete_rate > 0:
+            tasks.append(self.run_deletes())
+        return tasks
+
+    def cleanup(self) -> int:
+        """Удаление файлов прогона из папки: и созданных здесь, и фото,
+        сохранённых ботом. Watcher удалит их результаты"""
+        removed = 0
+        for pattern in ("loadtest-*.jpg", f"{FILE_PREFIX}-*.part"):
+            for path in self.watch_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+                removed += 1
+        self.created = []
+        return removed
@@ -0,0 +1,275 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+
+from aiohttp import web
+from pathlib import Path
+from dotenv import load_dotenv
+from fake_telegram import FakeTelegramServer
+from files import FileDropGenerator, OutputWatcher, make_image
+from stats import LatencyStats
+
+load_dotenv()
+
+FILE_HASH = re.compile(r"^[0-9a-f]{32}$")
+
+ACTIONS = ("random", "photo", "delete")
+
+
+class ChatSimulator:
+    """Пользователь в личном чате с ботом: действие, ответ бота, пауза.
+
+    Удаляются только изображения, созданные этим прогоном: их hash
+    (md5 содержимого, как на сервере) попадает в own_hashes.
+    """
+
+    def __init__(
+        self,
+        chat_id: int,
+        telegram: FakeTelegramServer,
+        outputs: OutputWatcher,
+        stats: LatencyStats,
+        own_hashes: set[str],
+        deletable: list[str],
+        args: argparse.Namespace,
+    ):
+        self.chat_id = chat_id
+        self.telegram = telegram
+        self.outputs = outputs
+        self.stats = stats
+        self.own_hashes = own_hashes
+        self.deletable = deletable
+        self.args = args
+
+    async def run(self) -> None:
+        weights = (
+            self.args.random_weight,
+            self.args.photo_weight,
+            self.args.delete_weight,
+        )
+        while True:
+            if self.args.think_time > 0:
+                await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+
+            action = random.choices(ACTIONS, weights)[0]
+            if action == "delete" and not self.deletable:
+                action = "random"
+
+            # Ответы на прошлое действие, пришедшие после таймаута
+            self.telegram.clear_inbox(self.chat_id)
+            await getattr(self, action)()
+
+    async def receive(self) -> tuple[float, dict]:
+        return await self.telegram.receive(self.chat_id, self.args.reply_timeout)
+
+    async def random(self) -> None:
+        started = time.perf_counter()
+        self.telegram.user_command(self.chat_id, "/random")
+        try:
+            while True:
+                received, message = await self.receive()
+                if "photo" in message:
+                    self.stats.record("random → фото", received - started)
+                    break
+                if message.get("text", "").startswith("❌"):
+                    self.stats.error("random → фото")
+                    return
+
+            # id фотки бот присылает отдельным сообщением
+            while True:
+                _, message = await self.receive()
+                file_hash = message.get("text", "")
+                if not FILE_HASH.match(file_hash):
+                    continue
+                if file_hash in self.own_hashes and file_hash not in self.deletable:
+                    self.deletable.append(file_hash)
+                return
+
+        except asyncio.TimeoutError:
+            self.stats.error("random → фото")
+
+    async def photo(self) -> None:
+        size = (self.args.width, self.args.height)
+        data = await asyncio.to_thread(make_image, *size)
+        self.own_hashes.add(hashlib.md5(data).hexdigest())
+
+        started = time.perf_counter()
+        file_id = self.telegram.user_photo(self.chat_id, data, size)
+        try:
+            received, message = await self.receive()
+        except asyncio.TimeoutError:
+            self.stats.error("фото → ответ")
+            return
+
+        if not message.get("text", "").startswith("✅"):
+            self.stats.error("фото → ответ")
+            return
+
+        self.stats.record("фото → ответ", received - started)
+        # Результат сервера называется так же, как сохранённое ботом фото
+        self.outputs.expect(f"{file_id}.jpg", "фото → результат", started)
+
+    async def delete(self) -> None:
+        file_hash = self.deletable.pop(random.randrange(len(self.deletable)))
+        started = time.perf_counter()
+        self.telegram.user_command(self.chat_id, f"/delete {file_hash}")
+        try:
+            received, message = await self.receive()
+        except asyncio.TimeoutError:
+            self.stats.error("delete → ответ")
+            return
+
+        if message.get("text", "").startswith("✅"):
+            self.stats.record("delete → ответ", received - started)
+        else:
+            self.stats.error("delete → ответ")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон всей системы на одной машине: фейковый "
+        "Telegram Bot API для бота и генератор файлов для watcher. "
+        "Запускайте на тестовой библиотеке (ORIGINALS_PATH, OUTPUT_PATH, DB_PATH)"
+    )
+    parser.add_argument("--port", type=int, default=8081, help="порт фейкового API")
+    parser.add_argument(
+        "--watch-dir",
+        type=Path,
+        default=Path(os.getenv("WATCHER_INPUT_PATH", "../input_photos")),
+        help="папка, за которой следит watcher (его WATCHER_INPUT_PATH)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path(os.getenv("OUTPUT_PATH", "../processed_photos")),
+        help="папка результатов сервера",
+    )
+    parser.add_argument("--duration", type=float, default=60, help="секунд нагрузки")
+    parser.add_argument("--chats", type=int, default=10, help="число чатов")
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=2,
+        help="средняя пауза пользователя между действиями, с",
+    )
+    parser.add_argument("--random-weight", type=float, default=6, help="доля /random")
+    parser.add_argument("--photo-weight", type=float, default=3, help="доля фото")
+    parser.add_argument(
+        "--delete-weight",
+        type=float,
+        default=1,
+        help="доля /delete (только изображения этого прогона)",
+    )
+    parser.add_argument(
+        "--drop-rate", type=float, default=1, help="новых файлов в папке в секунду"
+    )
+    parser.add_argument(
+        "--drop-delete-rate",
+        type=float,
+        default=0.2,
+        help="удалений файлов из папки в секунду",
+    )
+    parser.add_argument("--width", type=int, default=2000, help="ширина изображений")
+    parser.add_argument("--height", type=int, default=1500, help="высота изображений")
+    parser.add_argument(
+        "--reply-timeout", type=float, default=30, help="ожидание ответа бота, с"
+    )
+    parser.add_argument(
+        "--output-timeout", type=float, default=120, help="ожидание результата, с"
+    )
+    parser.add_argument(
+        "--keep-files",
+        action="store_true",
+        help="не удалять созданные в папке файлы после прогона",
+    )
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    stats = LatencyStats()
+    telegram = FakeTelegramServer()
+    outputs = OutputWatcher(args.output_dir, stats, args.output_timeout)
+    own_hashes: set[str] = set()
+    deletable: list[str] = []
+    drops = FileDropGenerator(
+        args.watch_dir,
+        outputs,
+        own_hashes,
+        args.drop_rate,
+        args.drop_delete_rate,
+        (args.width, args.height),
+    )
+
+    runner = web.AppRunner(telegram.app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    print("Фейковый Telegram запущен. Запустите бота с")
+    print(f"  TELEGRAM_BASE_URL={base_url}/bot")
+    print(f"  TELEGRAM_BASE_FILE_URL={base_url}/file/bot")
+    print(f"  ORIGINALS_PATH={args.watch_dir.resolve()}")
+    print("и watcher с")
+    print(f"  WATCHER_INPUT_PATH={args.watch_dir.resolve()}")
+
+    tasks = []
+    interrupted = False
+    started = time.perf_counter()
+    try:
+        await telegram.bot_connected.wait()
+        print(f"Бот подключился, нагрузка {args.duration:.0f} с")
+
+        loops = [
+            ChatSimulator(
+                1000 + number, telegram, outputs, stats, own_hashes, deletable, args
+            ).run()
+            for number in range(args.chats)
+        ]
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(coro)
+            for coro in [outputs.run(), *loops, *drops.tasks()]
+        ]
+        await asyncio.sleep(args.duration)
+
+    except asyncio.CancelledError:
+        interrupted = True
+        print("Прервано, итоги по собранному")
+
+    elapsed = time.perf_counter() - started
+    # Нагрузка остановлена, но уже созданные файлы ещё обрабатываются
+    for task in tasks[1:]:
+        task.cancel()
+    if outputs.pending and not interrupted:
+        print(f"Ожидание результатов: {len(outputs.pending)}")
+        await outputs.drain(args.output_timeout)
+    for task in tasks[:1]:
+        task.cancel()
+
+    telegram.release_polls()
+    await runner.cleanup()
+
+    print(
+        f"\nЗа {elapsed:.0f} с: файлов создано {drops.created_total}, "
+        f"удалено {drops.deleted}"
+    )
+    if not args.keep_files:
+        print(f"Удалено файлов прогона: {drops.cleanup()}")
+    print(stats.report(elapsed))
+
+
+def main():
+    args = parse_args()
+    args.watch_dir.mkdir(exist_ok=True)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
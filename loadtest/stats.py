@@ -0,0 +1,46 @@
+import math
+
+from collections import defaultdict
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """Перцентиль методом ближайшего ранга, значения уже отсортированы"""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyStats:
+    """Задержки по метрикам, плюс ошибки и таймауты"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, metric: str, seconds: float) -> None:
+        self.samples[metric].append(seconds)
+
+    def error(self, metric: str) -> None:
+        self.errors[metric] += 1
+
+    def report(self, elapsed: float) -> str:
+        header = f"{'метрика':<20} {'n':>6} {'ошибок':>7} " + " ".join(
+            f"{f'p{p}, мс':>9}" for p in PERCENTILES
+        )
+        lines = [header + f" {'max, мс':>9} {'в сек':>7}"]
+
+        for metric in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples[metric])
+            line = f"{metric:<20} {len(values):>6} {self.errors[metric]:>7} "
+            if values:
+                line += " ".join(
+                    f"{percentile(values, p) * 1000:>9.0f}" for p in PERCENTILES
+                )
+                line += f" {values[-1] * 1000:>9.0f}"
+            else:
+                line += " ".join(f"{'-':>9}" for _ in range(len(PERCENTILES) + 1))
+            line += f" {len(values) / elapsed:>7.2f}" if elapsed > 0 else ""
+            lines.append(line)
+
+        return "\n".join(lines)
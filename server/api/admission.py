@@ -0,0 +1,90 @@
+import threading
+
+from PIL import Image
+from contextlib import contextmanager
+from utils.exceptions import ImageTooLargeError, ServerBusyError
+
+MB = 1024 * 1024
+
+# Pillow хранит многоканальные изображения по 4 байта на пиксель
+_BYTES_PER_PIXEL = {
+    "1": 1,
+    "L": 1,
+    "P": 1,
+    "I;16": 2,
+    "I": 4,
+    "F": 4,
+}
+
+
+class DecodeAdmission:
+    """Контроль памяти на декодирование изображений.
+
+    Стоимость декодирования оценивается по заголовку файла, до загрузки
+    пикселей. Суммарная стоимость одновременных декодирований ограничена
+    max_total_bytes, каждое отдельное - max_image_bytes.
+    """
+
+    def __init__(
+        self,
+        max_image_bytes: int = 256 * MB,
+        max_total_bytes: int = 1024 * MB,
+        wait_timeout: float = 30,
+    ):
+        self.max_image_bytes = max_image_bytes
+        self.max_total_bytes = max(max_total_bytes, max_image_bytes)
+        self.wait_timeout = wait_timeout
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def estimate(image: Image.Image) -> int:
+        """Оценка памяти на декодирование и приведение к RGB"""
+        width, height = image.size
+        pixels = width * height
+        cost = pixels * _BYTES_PER_PIXEL.get(image.mode, 4)
+        if image.mode != "RGB":
+            cost += pixels * 4
+        return cost
+
+    def prepare(self, image: Image.Image, size: tuple[int, int]) -> int:
+        """Уменьшение при декодировании и проверка бюджета на одно изображение.
+
+        Для JPEG draft() выбирает масштаб DCT (1/2, 1/4, 1/8) так, чтобы
+        изображение осталось не меньше size. Для прочих форматов ничего
+        не меняется.
+        """
+        image.draft("RGB", size)
+        return self.check(image.size, self.estimate(image))
+
+    def check(self, size: tuple[int, int], cost: int) -> int:
+        """Проверка бюджета на одно изображение по оценке из заголовка"""
+        if cost > self.max_image_bytes:
+            raise ImageTooLargeError(
+                f"Изображение {size[0]}x{size[1]} требует "
+                f"{cost // MB} МБ при лимите {self.max_image_bytes // MB} МБ"
+            )
+        return cost
+
+    @contextmanager
+    def reserve(self, cost: int):
+        """Резервирование памяти в общем бюджете на время декодирования"""
+        with self._condition:
+            acquired = self._condition.wait_for(
+                lambda: self._in_use + cost <= self.max_total_bytes,
+                timeout=self.wait_timeout,
+            )
+            if not acquired:
+                raise ServerBusyError("Нет памяти для декодирования, повторите позже")
+            self._in_use += cost
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= cost
+                self._condition.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
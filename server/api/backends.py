@@ -0,0 +1,335 @@
+import io
+import time
+import logging
+import tempfile
+
+from PIL import Image, ExifTags
+from abc import ABC, abstractmethod
+from pathlib import Path
+from logging import Logger
+from typing import Dict, Any, BinaryIO
+from dataclasses import dataclass, replace
+from api.admission import DecodeAdmission
+from api.transform import (
+    apply_orientation,
+    get_orientation,
+    pad_to_frame,
+    plan_resize,
+    source_frame,
+)
+
+
+# Форматы, которые принимает сервер. Остальные плагины Pillow не загружаем
+IMAGE_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+def load_image_plugins() -> None:
+    """Регистрация только нужных плагинов Pillow вместо полного Image.init()"""
+    from PIL import JpegImagePlugin, PngImagePlugin, WebPImagePlugin  # noqa: F401
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """Параметры JPEG кодировщика"""
+
+    quality: int = 85
+    # Дополнительный проход для оптимальных таблиц Хаффмана
+    optimize: bool = True
+    progressive: bool = False
+    # 4:4:4, 4:2:2 или 4:2:0
+    subsampling: str = "4:2:0"
+
+
+ENCODER_PROFILES = {
+    "default": EncoderProfile(),
+    "fast": EncoderProfile(optimize=False),
+    "progressive": EncoderProfile(optimize=True, progressive=True),
+    "quality": EncoderProfile(subsampling="4:4:4"),
+}
+
+
+def get_encoder_profile(name: str, quality: int) -> EncoderProfile:
+    if name not in ENCODER_PROFILES:
+        raise ValueError(f"Неизвестный профиль кодировщика: {name}")
+    return replace(ENCODER_PROFILES[name], quality=quality)
+
+
+class ResizeBackend(ABC):
+    """Ресайз и кодирование одного изображения в JPEG"""
+
+    name: str
+
+    def __init__(self, admission: DecodeAdmission):
+        self.admission = admission
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def render(
+        self,
+        source: BinaryIO | Path,
+        destination: Path,
+        frame: tuple[int, int],
+        resize_mode: str,
+        profile: EncoderProfile,
+        strip_metadata: bool,
+    ) -> None: ...
+
+
+class PillowBackend(ResizeBackend):
+    name = "pillow"
+
+    def render(
+        self,
+        source: BinaryIO | Path,
+        destination: Path,
+        frame: tuple[int, int],
+        resize_mode: str,
+        profile: EncoderProfile,
+        strip_metadata: bool,
+    ) -> None:
+        load_image_plugins()
+
+        # Image.open читает только заголовок, пиксели грузятся позже
+        with Image.open(source, formats=IMAGE_FORMATS) as image:
+            # Ориентацию учитываем в координатах исходника, а сам поворот
+            # делаем уже на уменьшенном изображении
+            orientation = get_orientation(image)
+            target_frame = source_frame(frame, orientation)
+            save_options = {} if strip_metadata else self._metadata_options(image)
+
+            cost = self.admission.prepare(image, target_frame)
+
+            with self.admission.reserve(cost):
+                rgb_image = image if image.mode == "RGB" else image.convert("RGB")
+
+                size, box = plan_resize(rgb_image.size, target_frame, resize_mode)
+                resized_image = rgb_image.resize(
+                    size, Image.Resampling.LANCZOS, box=box
+                )
+
+        resized_image = apply_orientation(resized_image, orientation)
+        if resize_mode == "fit":
+            resized_image = pad_to_frame(resized_image, frame)
+
+        resized_image.save(
+            destination,
+            "JPEG",
+            quality=profile.quality,
+            optimize=profile.optimize,
+            progressive=profile.progressive,
+            subsampling=profile.subsampling,
+            **save_options,
+        )
+
+    @staticmethod
+    def _metadata_options(image: Image.Image) -> Dict[str, Any]:
+        """Метаданные исходника для сохранения в результат"""
+        options: Dict[str, Any] = {}
+        exif = image.getexif()
+        if exif:
+            # Поворот уже применён к пикселям
+            exif.pop(ExifTags.Base.Orientation, None)
+            options["exif"] = exif.tobytes()
+        icc_profile = image.info.get("icc_profile")
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        return options
+
+
+class VipsBackend(ResizeBackend):
+    """Потоковый ресайз через libvips: shrink-on-load и обработка по тайлам"""
+
+    name = "vips"
+
+    # Байт на канал для форматов пикселей libvips
+    FORMAT_BYTES = {"uchar": 1, "char": 1, "ushort": 2, "short": 2}
+
+    @staticmethod
+    def _pyvips() -> Any:
+        import pyvips
+
+        # pyvips передаёт в logging INFO сообщения libvips, это десятки
+        # строк на каждое изображение
+        logging.getLogger("pyvips").setLevel(logging.WARNING)
+        return pyvips
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            cls._pyvips()
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def render(
+        self,
+        source: BinaryIO | Path,
+        destination: Path,
+        frame: tuple[int, int],
+        resize_mode: str,
+        profile: EncoderProfile,
+        strip_metadata: bool,
+    ) -> None:
+        pyvips = self._pyvips()
+
+        width, height = frame
+        options: Dict[str, Any] = {"height": height}
+        if resize_mode == "stretch":
+            options["size"] = pyvips.enums.Size.FORCE
+        elif resize_mode == "crop":
+            options["crop"] = pyvips.enums.Interesting.CENTRE
+
+        # Заголовок читается без декодирования пикселей
+        data = None
+        if isinstance(source, Path):
+            header = pyvips.Image.new_from_file(str(source), access="sequential")
+        else:
+            data = source.read()
+            header = pyvips.Image.new_from_buffer(data, "", access="sequential")
+        cost = self.admission.check(
+            (header.width, header.height), self._estimate(header, frame)
+        )
+
+        with self.admission.reserve(cost):
+            # thumbnail сам поворачивает изображение по EXIF
+            if data is None:
+                image = pyvips.Image.thumbnail(str(source), width, **options)
+            else:
+                image = pyvips.Image.thumbnail_buffer(data, width, **options)
+
+            if image.hasalpha():
+                image = image.flatten()
+            image = image.colourspace(pyvips.enums.Interpretation.SRGB)
+            if resize_mode == "fit":
+                image = image.gravity(
+                    pyvips.enums.CompassDirection.CENTRE,
+                    width,
+                    height,
+                    extend=pyvips.enums.Extend.BLACK,
+                )
+
+            save_options: Dict[str, Any] = {}
+            if strip_metadata:
+                # strip устарел с libvips 8.15 и пишет предупреждение
+                if pyvips.at_least_libvips(8, 15):
+                    save_options["keep"] = pyvips.enums.ForeignKeep.NONE
+                else:
+                    save_options["strip"] = True
+
+            image.jpegsave(
+                str(destination),
+                Q=profile.quality,
+                optimize_coding=profile.optimize,
+                interlace=profile.progressive,
+                subsample_mode=(
+                    pyvips.enums.ForeignSubsample.OFF
+                    if profile.subsampling == "4:4:4"
+                    else pyvips.enums.ForeignSubsample.ON
+                ),
+                **save_options,
+            )
+
+    @classmethod
+    def _estimate(cls, header: Any, frame: tuple[int, int]) -> int:
+        """Оценка памяти как у Pillow: JPEG декодируется сразу уменьшенным
+        (shrink-on-load в 2, 4 или 8 раз), прочие форматы - в полном размере"""
+        orientation = 1
+        if header.get_typeof("orientation"):
+            orientation = header.get("orientation")
+        target_width, target_height = source_frame(frame, orientation)
+
+        shrink = 1
+        if header.get("vips-loader").startswith("jpegload"):
+            while (
+                shrink < 8
+                and header.width // (shrink * 2) >= target_width
+                and header.height // (shrink * 2) >= target_height
+            ):
+                shrink *= 2
+
+        pixels = (header.width // shrink) * (header.height // shrink)
+        return pixels * header.bands * cls.FORMAT_BYTES.get(header.format, 4)
+
+
+BACKENDS: Dict[str, type[ResizeBackend]] = {
+    PillowBackend.name: PillowBackend,
+    VipsBackend.name: VipsBackend,
+}
+
+
+def _benchmark_sample() -> bytes:
+    """Тестовое фото: градиент размером с типичный снимок телефона"""
+    gradient = Image.linear_gradient("L")
+    rotated = gradient.transpose(Image.Transpose.ROTATE_90)
+    sample = Image.merge("RGB", (gradient, rotated, gradient)).resize((2000, 1500))
+    buffer = io.BytesIO()
+    sample.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def benchmark_backends(
+    backends: list[ResizeBackend],
+    frame: tuple[int, int],
+    resize_mode: str,
+    profile: EncoderProfile,
+    rounds: int = 3,
+) -> Dict[str, float]:
+    """Среднее время render() для каждого бэкенда на тестовом фото"""
+    sample = _benchmark_sample()
+    timings: Dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        destination = Path(tmp_dir) / "sample.jpg"
+        for backend in backends:
+
+            def run_once() -> None:
+                backend.render(
+                    io.BytesIO(sample), destination, frame, resize_mode, profile, True
+                )
+
+            # Первый прогон - прогрев, не считаем
+            run_once()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                run_once()
+            timings[backend.name] = (time.perf_counter() - started) / rounds
+
+    return timings
+
+
+def select_backend(
+    name: str,
+    admission: DecodeAdmission,
+    frame: tuple[int, int],
+    resize_mode: str,
+    profile: EncoderProfile,
+    logger: Logger,
+) -> ResizeBackend:
+    """Выбор бэкенда по имени, для auto - самый быстрый из доступных"""
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд ресайза: {name}")
+        if not BACKENDS[name].available():
+            raise ValueError(f"Бэкенд ресайза {name} недоступен")
+        return BACKENDS[name](admission)
+
+    backends = [cls(admission) for cls in BACKENDS.values() if cls.available()]
+    if len(backends) == 1:
+        return backends[0]
+
+    try:
+        timings = benchmark_backends(backends, frame, resize_mode, profile)
+    except Exception as e:
+        logger.warning("Не удалось сравнить бэкенды ресайза: %s", e)
+        return PillowBackend(admission)
+
+    fastest = min(backends, key=lambda backend: timings[backend.name])
+    logger.info(
+        "Бэкенд ресайза: %s (%s)",
+        fastest.name,
+        ", ".join(f"{name}={timing * 1000:.1f} мс" for name, timing in timings.items()),
+    )
+    return fastest
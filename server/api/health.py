@@ -0,0 +1,23 @@
+from flask import Flask
+from logging import Logger
+from utils.decorators import format_response
+from utils.exceptions import ServerBusyError
+from utils.startup import StartupTimer
+
+
+def setup_health_routes(app: Flask, logger: Logger, timer: StartupTimer):
+    @app.route("/health/live", methods=["GET"])
+    @format_response(success_code=200, logger=logger)
+    def liveness():
+        """Процесс жив и отвечает"""
+        return {"status": "alive"}
+
+    @app.route("/health/ready", methods=["GET"])
+    @format_response(success_code=200, logger=logger)
+    def readiness():
+        """Прогрев завершён, можно направлять трафик"""
+        if not timer.ready.is_set():
+            if timer.error:
+                raise ServerBusyError(f"Прогрев не удался: {timer.error}")
+            raise ServerBusyError("Сервер ещё прогревается")
+        return {"status": "ready", "startup": timer.report()}
@@ -0,0 +1,283 @@
+import os
+import uuid
+import socket
+import threading
+
+from PIL import Image, UnidentifiedImageError
+from pathlib import Path
+from logging import Logger
+from typing import BinaryIO, TYPE_CHECKING
+from contextlib import contextmanager
+from database.database_manager import DatabaseManager, ImageStatus, JobState
+from database.job_queue import JobQueue
+from api.limits import Priority, PriorityScheduler
+from utils.exceptions import ImageNotFoundError, ImageTooLargeError, ServerBusyError
+
+if TYPE_CHECKING:
+    from api.processor import ImageProcessor
+
+
+class JobRunner:
+    """Выполнение задач на ресайз с арендой, повторами и восстановлением.
+
+    Задачу выполняет тот, кто её захватил (claim). Пока идёт ресайз, аренда
+    продлевается фоновым heartbeat. Если процесс упал, аренда истекает и
+    задачу подбирает восстановление при старте или фоновый воркер.
+
+    db_manager нужен только процессу API: он записывает в БД статусы,
+    присланные воркерами других узлов через очередь.
+
+    scheduler ограничивает число одновременных ресайзов: задачи, которых
+    ждёт клиент, получают слот раньше фоновых.
+    """
+
+    # Ошибки, которые не исправятся повтором
+    PERMANENT_ERRORS = (
+        Image.DecompressionBombError,
+        ImageTooLargeError,
+        UnidentifiedImageError,
+        FileNotFoundError,
+        ImageNotFoundError,
+    )
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        image_processor: "ImageProcessor",
+        logger: Logger,
+        db_manager: DatabaseManager | None = None,
+        run_worker: bool = True,
+        max_attempts: int = 5,
+        lease_seconds: float = 60,
+        backoff_base: float = 5,
+        backoff_max: float = 600,
+        poll_interval: float = 5,
+        scheduler: PriorityScheduler | None = None,
+    ):
+        self.queue = queue
+        self.db_manager = db_manager
+        self.run_worker = run_worker
+        self.image_processor = image_processor
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def submit(
+        self,
+        original_path: Path | str,
+        file_hash: str,
+        source: BinaryIO | Path | None = None,
+        priority: int = Priority.REQUEST,
+    ) -> dict:
+        """Идемпотентная обработка: готовое не пересчитывается, упавшее
+        окончательно - не повторяется"""
+        output_key = self.image_processor.get_output_key(original_path)
+        state = self.queue.enqueue(file_hash, str(original_path))
+
+        if state == JobState.DONE:
+            if self.image_processor.output_exists(original_path):
+                return {"message": f"Image already processed: {output_key}"}
+            # Результат потерян, обрабатываем заново
+            state = self.queue.enqueue(file_hash, str(original_path), reset=True)
+
+        if state == JobState.FAILED:
+            job = self.queue.get(file_hash)
+            if job is None:
+                raise ValueError("Image failed")
+            raise ValueError(
+                f"Image failed after {job['attempts']} attempts: {job['last_error']}"
+            )
+
+        # На нескольких узлах задачу выполнит свободный воркер
+        if not self.queue.inline or not self.queue.claim(
+            file_hash, self.owner, self.lease_seconds
+        ):
+            return {"message": f"Image is queued: {output_key}"}
+
+        return self._execute(original_path, file_hash, source, priority)
+
+    def _execute(
+        self,
+        original_path: Path | str,
+        file_hash: str,
+        source: BinaryIO | Path | None,
+        priority: int = Priority.REQUEST,
+    ) -> dict:
+        """Ресайз захваченной задачи с обновлением статуса в БД.
+
+        Любая ошибка, включая запись статуса, проходит через _fail:
+        захваченная задача не остаётся в running.
+        """
+        try:
+            self.queue.publish_status(file_hash, ImageStatus.PROCESSING)
+            with self._slot(priority), self._heartbeat(file_hash):
+                # Обрабатываем изображение
+                output_key = self.image_processor.process_and_save_image(
+                    original_path, source
+                )
+
+            # Успешное завершение
+            self.queue.complete(file_hash, self.owner)
+            self.queue.publish_status(file_hash, ImageStatus.SUCCESS)
+            return {"message": f"Image processed: {output_key}"}
+
+        except self.PERMANENT_ERRORS as e:
+            self._fail(file_hash, f"Изображение не обработано: {e}", retry=False)
+            # Ответ 413 формирует format_response
+            if isinstance(e, ImageTooLargeError):
+                raise
+            if isinstance(e, Image.DecompressionBombError):
+                raise ImageTooLargeError(f"Image is too big: {e}")
+            raise ValueError(f"Image cannot be processed: {e}")
+
+        except ServerBusyError as e:
+            # Ресайз не начинался: попытка не тратится, ошибки у изображения
+            # нет. Задачу доделает фоновый воркер после задержки
+            self.queue.release(file_hash, self.owner, self.backoff_base)
+            self.logger.warning("Задача %s отложена: %s", file_hash, e)
+            raise
+
+        except Exception as e:
+            self._fail(file_hash, f"Ошибка обработки: {e}", retry=True)
+            raise
+
+    def _fail(self, file_hash: str, error_message: str, retry: bool) -> None:
+        state = self.queue.fail(
+            file_hash,
+            self.owner,
+            error_message,
+            retry,
+            self.max_attempts,
+            self.backoff_base,
+            self.backoff_max,
+        )
+        try:
+            self.queue.publish_status(file_hash, ImageStatus.ERROR, error_message)
+        except ImageNotFoundError:
+            # Изображение успели удалить или заменить
+            pass
+        self.logger.error("%s (%s, задача: %s)", error_message, file_hash, state.value)
+
+    @contextmanager
+    def _slot(self, priority: int):
+        """Слот обработки у планировщика, если он задан"""
+        if self.scheduler is None:
+            yield
+            return
+
+        with self.scheduler.slot(priority):
+            yield
+
+    @contextmanager
+    def _heartbeat(self, file_hash: str):
+        """Продление аренды, пока идёт обработка"""
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.lease_seconds / 3):
+                if not self.queue.heartbeat(file_hash, self.owner, self.lease_seconds):
+                    self.logger.warning("Аренда задачи %s потеряна", file_hash)
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    # Фоновый воркер
+
+    def recover(self) -> int:
+        """Возврат в очередь задач с истёкшей арендой"""
+        recovered = self.queue.recover()
+        if recovered:
+            self.logger.warning("Возвращено в очередь задач: %s", recovered)
+        return recovered
+
+    def recover_stale(self) -> int:
+        """Сверка после рестарта: изображения, зависшие в PROCESSING.
+        Полный просмотр таблицы, поэтому только один раз при старте"""
+        recovered = self.queue.recover_stale()
+        if recovered:
+            self.logger.warning("Поставлено в очередь зависших: %s", recovered)
+        return recovered
+
+    def apply_statuses(self) -> int:
+        """Запись в БД статусов, присланных воркерами других узлов"""
+        if self.db_manager is None:
+            return 0
+
+        statuses = self.queue.drain_statuses()
+        for file_hash, status, error_message in statuses:
+            try:
+                self.db_manager.update_status(file_hash, status, error_message)
+            except ImageNotFoundError:
+                # Изображение успели удалить
+                pass
+        return len(statuses)
+
+    def start(self, threads: int = 1) -> None:
+        """Запуск фоновых воркеров. Восстановление после рестарта - их первый
+        шаг, поэтому старт сервера не ждёт обращения к очереди"""
+        self._stop.clear()
+        for number in range(threads):
+            thread = threading.Thread(
+                target=self.run_loop,
+                args=(number == 0,),
+                name=f"job-runner-{number}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run_loop(self, recover_stale: bool = False) -> None:
+        """Цикл воркера: статусы, восстановление аренд и следующая задача.
+
+        recover_stale - сначала сверить зависшие изображения (один поток).
+        """
+        while recover_stale and self.run_worker and not self._stop.is_set():
+            try:
+                self.recover_stale()
+                break
+            except Exception as e:
+                self.logger.error("Ошибка восстановления задач: %s", e)
+                self._stop.wait(self.poll_interval)
+
+        while not self._stop.is_set():
+            try:
+                applied = self.apply_statuses()
+                job = None
+                if self.run_worker:
+                    self.recover()
+                    job = self.queue.claim_next(self.owner, self.lease_seconds)
+
+                if job is None:
+                    if not applied:
+                        self._stop.wait(self.poll_interval)
+                    continue
+
+                self._execute(
+                    job["original_path"], job["file_hash"], None, Priority.BACKGROUND
+                )
+
+            except ServerBusyError:
+                # Слоты заняты запросами клиентов, задача вернулась в очередь
+                self._stop.wait(self.poll_interval)
+            except Exception as e:
+                self.logger.error("Ошибка фонового воркера: %s", e)
+                self._stop.wait(self.poll_interval)
@@ -0,0 +1,216 @@
+import heapq
+import itertools
+import threading
+import time
+
+from enum import Enum
+from flask import Flask, Response, g, jsonify, request
+from logging import Logger
+from typing import Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from utils.exceptions import ServerBusyError
+
+
+class RequestClass(Enum):
+    # Запросы бота: должны отвечать всегда
+    INTERACTIVE = "interactive"
+    # Массовая загрузка от watcher
+    BULK = "bulk"
+
+
+class Priority:
+    """Приоритеты в очереди на обработку: меньше - раньше"""
+
+    # Клиент ждёт ответа
+    REQUEST = 0
+    # Повторы и задачи фонового воркера
+    BACKGROUND = 1
+
+
+# Эндпоинт -> класс запроса. Остальные считаются интерактивными
+ENDPOINT_CLASSES = {
+    "process_image": RequestClass.BULK,
+    "upload_image": RequestClass.BULK,
+}
+
+# Пробы оркестратора не ограничиваются
+EXEMPT_ENDPOINTS = {"liveness", "readiness"}
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Взять токен. Возвращает 0 или сколько секунд ждать следующего"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """Ведро токенов на каждого клиента, давно неактивные вытесняются"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client_id: str) -> float:
+        """0 - запрос разрешён, иначе через сколько секунд повторить"""
+        if self.rate <= 0:
+            return 0
+
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[client_id] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            return bucket.take()
+
+
+class ConcurrencyLimiter:
+    """Ограничение одновременных запросов класса с коротким ожиданием"""
+
+    def __init__(self, limit: int, wait_timeout: float):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self) -> bool:
+        return self._semaphore.acquire(timeout=self.wait_timeout)
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class PriorityScheduler:
+    """Слоты обработки изображений, выдаются по приоритету.
+
+    Освободившийся слот получает ожидающий с наименьшим приоритетом, при
+    равенстве - пришедший раньше. Длина очереди и время ожидания ограничены:
+    при перегрузе сразу ServerBusyError, а не бесконечная очередь.
+    """
+
+    def __init__(self, slots: int, max_waiting: int, wait_timeout: float):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._busy = 0
+        self._waiting: list[tuple[int, int, threading.Event]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, priority: int):
+        self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, priority: int) -> None:
+        with self._lock:
+            if self._busy < self.slots and not self._waiting:
+                self._busy += 1
+                return
+
+            if len(self._waiting) >= self.max_waiting:
+                raise ServerBusyError("Очередь на обработку переполнена")
+
+            entry = (priority, next(self._counter), threading.Event())
+            heapq.heappush(self._waiting, entry)
+
+        if entry[2].wait(self.wait_timeout):
+            return
+
+        with self._lock:
+            # Слот могли выдать между таймаутом и захватом блокировки
+            if entry[2].is_set():
+                return
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+        raise ServerBusyError("Нет свободных слотов обработки")
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiting:
+                # Слот передаётся следующему без освобождения
+                _, _, event = heapq.heappop(self._waiting)
+                event.set()
+            else:
+                self._busy -= 1
+
+
+def _error_response(message: str, error_type: str, code: int) -> tuple[Response, int]:
+    return (
+        jsonify({"status": "error", "message": message, "error_type": error_type}),
+        code,
+    )
+
+
+def setup_request_limits(app: Flask, logger: Logger, config: Dict[str, Any]):
+    """Ограничение частоты по клиентам и одновременных запросов по классам"""
+    rate_limiters = {
+        RequestClass.INTERACTIVE: ClientRateLimiter(
+            config["RATE_LIMIT_INTERACTIVE"], config["RATE_LIMIT_INTERACTIVE_BURST"]
+        ),
+        RequestClass.BULK: ClientRateLimiter(
+            config["RATE_LIMIT_BULK"], config["RATE_LIMIT_BULK_BURST"]
+        ),
+    }
+    concurrency_limiters = {
+        RequestClass.INTERACTIVE: ConcurrencyLimiter(
+            config["INTERACTIVE_CONCURRENCY"], config["CONCURRENCY_WAIT_TIMEOUT"]
+        ),
+        RequestClass.BULK: ConcurrencyLimiter(
+            config["BULK_CONCURRENCY"], config["CONCURRENCY_WAIT_TIMEOUT"]
+        ),
+    }
+
+    @app.before_request
+    def limit_request():
+        if request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+
+        request_class = ENDPOINT_CLASSES.get(request.endpoint, RequestClass.INTERACTIVE)
+        client_id = request.headers.get("X-Client-Id") or request.remote_addr or "-"
+
+        retry_after = rate_limiters[request_class].check(client_id)
+        if retry_after:
+            logger.warning("⚠️ Rate limit: %s (%s)", client_id, request_class.value)
+            response, code = _error_response(
+                "Слишком много запросов", "rate_limited", 429
+            )
+            response.headers["Retry-After"] = str(max(1, round(retry_after)))
+            return response, code
+
+        if not concurrency_limiters[request_class].acquire():
+            logger.warning("⚠️ Server busy: %s", request_class.value)
+            return _error_response("Сервер перегружен", "server_busy", 503)
+
+        g.request_class = request_class
+        return None
+
+    @app.teardown_request
+    def release_request(exception=None):
+        request_class = g.pop("request_class", None)
+        if request_class is not None:
+            concurrency_limiters[request_class].release()
@@ -0,0 +1,96 @@
+import os
+import base64
+import tempfile
+
+from pathlib import Path
+from logging import Logger
+from typing import BinaryIO
+from database.database_manager import DatabaseManager
+from api.admission import DecodeAdmission
+from api.transform import RESIZE_MODES
+from api.backends import EncoderProfile, PillowBackend, ResizeBackend
+from storage.storage import LocalStorage, Storage
+
+
+class ImageProcessor:
+    WIDTH = 500
+    HEIGHT = 700
+    JPEG_QUALITY = 85  # Баланс между качеством и размером файла
+
+    def __init__(
+        self,
+        output_path: str,
+        db_manager: DatabaseManager,
+        logger: Logger,
+        admission: DecodeAdmission | None = None,
+        resize_mode: str = "stretch",
+        strip_metadata: bool = True,
+        backend: ResizeBackend | None = None,
+        encoder_profile: EncoderProfile | None = None,
+        originals_storage: Storage | None = None,
+        output_storage: Storage | None = None,
+    ):
+        if resize_mode not in RESIZE_MODES:
+            raise ValueError(f"Неизвестный режим ресайза: {resize_mode}")
+
+        self.output_path = Path(output_path)
+        # По умолчанию original_path - путь на локальном диске
+        self.originals_storage = originals_storage or LocalStorage("/")
+        self.output_storage = output_storage or LocalStorage(self.output_path)
+        self.db_manager = db_manager
+        self.logger = logger
+        self.admission = admission or DecodeAdmission()
+        self.resize_mode = resize_mode
+        self.strip_metadata = strip_metadata
+        self.backend = backend or PillowBackend(self.admission)
+        self.encoder_profile = encoder_profile or EncoderProfile(
+            quality=self.JPEG_QUALITY
+        )
+
+    def get_decoded_image(self, original_path: str) -> str:
+        image_data = self.originals_storage.read_bytes(original_path)
+        return base64.b64encode(image_data).decode("utf-8")
+
+    def process_and_save_image(
+        self, original_path: Path | str, source: BinaryIO | Path | None = None
+    ) -> str:
+        """Ресайз и сохранение в хранилище результатов. Возвращает ключ.
+
+        source - уже прочитанные данные изображения, если они есть,
+        иначе изображение читается из хранилища оригиналов.
+        """
+        output_key = self.get_output_key(original_path)
+        opened = None
+        if source is None:
+            source = opened = self.originals_storage.open(str(original_path))
+
+        # Пишем во временный файл и атомарно сохраняем в хранилище, чтобы
+        # при падении там не остался недописанный JPEG
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.output_storage.staging_dir(), prefix=".", suffix=".jpg.tmp"
+        )
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            self.backend.render(
+                source,
+                tmp_path,
+                (self.WIDTH, self.HEIGHT),
+                self.resize_mode,
+                self.encoder_profile,
+                self.strip_metadata,
+            )
+            self.output_storage.put_file(output_key, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            if opened is not None and not isinstance(opened, Path):
+                opened.close()
+
+        return output_key
+
+    @staticmethod
+    def get_output_key(original_path: Path | str) -> str:
+        return f"{Path(original_path).stem}.jpg"
+
+    def output_exists(self, original_path: Path | str) -> bool:
+        return self.output_storage.exists(self.get_output_key(original_path))
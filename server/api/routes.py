@@ -1,52 +1,30 @@
-import base64
-
-
-from PIL import Image
 from pathlib import Path
 from flask import Flask, request
-from database.database_manager import DatabaseManager, ImageStatus
+from database.database_manager import ImageStatus
 from logging import Logger
 from typing import Dict, Any
-from utils.exceptions import ImageNotFoundError
+from utils.exceptions import (
+    ImageNotFoundError,
+    ImageTooLargeError,
+    ServerBusyError,
+)
 from utils.decorators import format_response
-
-
-class ImageProcessor:
-    WIDTH = 500
-    HEIGHT = 700
-    JPEG_QUALITY = 85  # Баланс между качеством и размером файла
-
-    def __init__(self, output_path: str, db_manager: DatabaseManager, logger: Logger):
-        self.output_path = Path(output_path)
-        self.db_manager = db_manager
-        self.logger = logger
-
-    @staticmethod
-    def get_decoded_image(image_path: str) -> str:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
-
-    def process_and_save_image(self, image_path: Path) -> Path:
-        new_filename = f"{image_path.stem}.jpg"
-        new_path = self.output_path / new_filename
-
-        with Image.open(image_path) as image:
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-
-            resized_image = image.resize(
-                (self.WIDTH, self.HEIGHT), Image.Resampling.LANCZOS
-            )
-            resized_image.save(
-                new_path, "JPEG", quality=self.JPEG_QUALITY, optimize=True
-            )
-
-        return new_path
-
-
-def setup_routes(app: Flask, logger: Logger, config: Dict[str, Any]):
-    db_manager = DatabaseManager()
-    image_processor = ImageProcessor(config["OUTPUT_PATH"], db_manager, logger)
+from api.admission import MB
+from api.upload import resolve_extension, store_multipart_upload, store_upload
+from api.services import Services, build_services
+from api.processor import ImageProcessor  # noqa: F401
+
+
+def setup_routes(
+    app: Flask,
+    logger: Logger,
+    config: Dict[str, Any],
+    services: Services | None = None,
+):
+    services = services or build_services(config, logger)
+    db_manager = services.db_manager
+    image_processor = services.image_processor
+    job_runner = services.job_runner
 
     # GET
 
@@ -71,9 +49,6 @@ def setup_routes(app: Flask, logger: Logger, config: Dict[str, Any]):
     @app.route("/random-image", methods=["GET"])
     @format_response(success_code=200, logger=logger)
     def get_random_image():
-        if not image_processor.output_path.exists():
-            raise FileNotFoundError("Output directory does not exist")
-
         try:
             random_image = db_manager.get_random_image()
             image = image_processor.get_decoded_image(random_image["original_path"])
@@ -88,6 +63,7 @@ def setup_routes(app: Flask, logger: Logger, config: Dict[str, Any]):
     @app.route("/images", methods=["POST"])
     @format_response(success_code=201, logger=logger)
     def process_image():
+        file_hash = None
         try:
             data = request.get_json()
 
@@ -100,38 +76,68 @@ def setup_routes(app: Flask, logger: Logger, config: Dict[str, Any]):
             # Начинаем обработку - сохраняем в БД и получаем hash
             file_hash = db_manager.process_image(Path(absolute_path))
 
-            db_manager.update_status(file_hash, ImageStatus.PROCESSING)
-
-            try:
-                # Создаем директорию если не существует
-                image_processor.output_path.mkdir(exist_ok=True)
-
-                # Обрабатываем изображение
-                new_path = image_processor.process_and_save_image(absolute_path)
+            return job_runner.submit(absolute_path, file_hash)
 
-                # Успешное завершение
-                db_manager.update_status(file_hash, ImageStatus.SUCCESS)
-                return {"message": f"Image processed: {new_path.name}"}
+        except (ValueError, ImageTooLargeError, ServerBusyError):
+            raise
 
-            except Image.DecompressionBombError:
-                db_manager.update_status(
-                    file_hash, ImageStatus.ERROR, "Изображение слишком большое"
-                )
-                logger.error("Изображение не обработано. Cлишком большое", file_hash)
-                raise ValueError("Image is too big")
-
-            except Exception as e:
+        except Exception as e:
+            # Прочие ошибки
+            if file_hash is not None:
                 db_manager.update_status(
-                    file_hash, ImageStatus.ERROR, f"Ошибка обработки: {str(e)}"
+                    file_hash, ImageStatus.ERROR, f"Неожиданная ошибка: {str(e)}"
                 )
-                logger.error("Ошибка обработки изображения", str(e))
+            logger.error(f"Ошибка при обработке изображения: {str(e)}")
+            raise
 
-        except Exception as e:
-            # Прочие ошибки
-            db_manager.update_status(
-                file_hash, ImageStatus.ERROR, f"Неожиданная ошибка: {str(e)}"
+    @app.route("/images/upload", methods=["POST"])
+    @format_response(success_code=201, logger=logger)
+    def upload_image():
+        """Загрузка изображения телом запроса или multipart полем file.
+
+        Тело читается потоком один раз: пишется во временный файл и
+        хешируется на лету, затем файл сохраняется в хранилище оригиналов.
+        """
+        if config["STORAGE_BACKEND"] == "local" and not config["ORIGINALS_PATH"]:
+            raise ValueError("ORIGINALS_PATH не настроен")
+
+        max_bytes = config["MAX_CONTENT_LENGTH"]
+        memory_limit = config["UPLOAD_MEMORY_LIMIT_MB"] * MB
+        if request.mimetype == "multipart/form-data":
+            # request.files не используется: werkzeug сохранил бы файл
+            # в свой временный файл, и он записался бы на диск дважды
+            upload = store_multipart_upload(
+                request.stream,
+                request.mimetype,
+                request.content_length,
+                request.mimetype_params,
+                image_processor.originals_storage,
+                max_bytes=max_bytes,
+                memory_limit=memory_limit,
+                max_form_memory_size=request.max_form_memory_size,
+            )
+        else:
+            extension = resolve_extension(
+                request.args.get("filename"), request.content_type
+            )
+            upload = store_upload(
+                request.stream,
+                image_processor.originals_storage,
+                extension,
+                max_bytes=max_bytes,
+                memory_limit=memory_limit,
             )
-            logger.error(f"Ошибка при обработке изображения: {str(e)}")
+
+        # Хеш уже посчитан при записи, повторно файл не читаем
+        try:
+            file_hash = db_manager.process_image(Path(upload.key), upload.file_hash)
+        except ValueError:
+            # Содержимое уже есть под другим путём: копия без записи в БД
+            # не нужна, удалить её потом было бы нечем
+            image_processor.originals_storage.delete(upload.key)
+            raise
+        result = job_runner.submit(upload.key, file_hash, upload.open_source())
+        return {**result, "file_hash": file_hash}
 
     # DELETE
 
@@ -141,15 +147,16 @@ def setup_routes(app: Flask, logger: Logger, config: Dict[str, Any]):
         try:
             file_info = db_manager.get_image_path(file_hash)
 
-            # Удаляем из БД
+            # Удаляем из БД и очереди задач
             db_manager.delete_image(file_hash)
+            job_runner.queue.delete(file_hash)
 
-            # Удаляем фото
-            original_path = Path(file_info["original_path"])
-
-            original_path = Path(file_info["original_path"])
-            if original_path.exists():
-                original_path.unlink()
+            # Удаляем результат и фото
+            original_path = file_info["original_path"]
+            image_processor.output_storage.delete(
+                image_processor.get_output_key(original_path)
+            )
+            if image_processor.originals_storage.delete(original_path):
                 return {"message": f"Deleted file: {original_path}"}
 
             return {"message": "File already deleted"}
@@ -0,0 +1,163 @@
+from logging import Logger
+from typing import Dict, Any
+from dataclasses import dataclass
+from database.database_manager import DatabaseManager
+from api.admission import DecodeAdmission, MB
+from api.backends import (
+    PillowBackend,
+    ResizeBackend,
+    get_encoder_profile,
+    load_image_plugins,
+    select_backend,
+)
+from api.jobs import JobRunner
+from api.limits import PriorityScheduler
+from api.processor import ImageProcessor
+from database.job_queue import JobQueue, build_job_queue
+from storage.storage import Storage, build_storage
+from utils.startup import StartupTimer
+
+
+@dataclass
+class Services:
+    db_manager: DatabaseManager
+    admission: DecodeAdmission
+    image_processor: ImageProcessor
+    job_queue: JobQueue
+    job_runner: JobRunner
+    originals_storage: Storage
+    output_storage: Storage
+
+
+def build_image_processor(
+    config: Dict[str, Any],
+    logger: Logger,
+    db_manager: DatabaseManager,
+    defer_backend: bool = False,
+) -> ImageProcessor:
+    """ImageProcessor с хранилищами, бюджетом памяти и бэкендом ресайза.
+
+    Для RESIZE_BACKEND=auto бэкенды сравниваются здесь же. defer_backend -
+    сравнение сделает prewarm, а до него используется Pillow.
+    """
+    originals_storage = build_storage(
+        config["STORAGE_BACKEND"],
+        config["ORIGINALS_PATH"] or "/",
+        config["S3_ORIGINALS_PREFIX"],
+        config,
+    )
+    output_storage = build_storage(
+        config["STORAGE_BACKEND"],
+        config["OUTPUT_PATH"],
+        config["S3_OUTPUT_PREFIX"],
+        config,
+    )
+    admission = DecodeAdmission(
+        max_image_bytes=config["DECODE_IMAGE_BUDGET_MB"] * MB,
+        max_total_bytes=config["DECODE_MEMORY_BUDGET_MB"] * MB,
+        wait_timeout=config["DECODE_WAIT_TIMEOUT"],
+    )
+    encoder_profile = get_encoder_profile(
+        config["JPEG_PROFILE"], ImageProcessor.JPEG_QUALITY
+    )
+    backend: ResizeBackend
+    if config["RESIZE_BACKEND"] == "auto" and defer_backend:
+        backend = PillowBackend(admission)
+    else:
+        backend = select_backend(
+            config["RESIZE_BACKEND"],
+            admission,
+            (ImageProcessor.WIDTH, ImageProcessor.HEIGHT),
+            config["RESIZE_MODE"],
+            encoder_profile,
+            logger,
+        )
+
+    return ImageProcessor(
+        config["OUTPUT_PATH"],
+        db_manager,
+        logger,
+        admission,
+        resize_mode=config["RESIZE_MODE"],
+        strip_metadata=config["STRIP_METADATA"],
+        backend=backend,
+        encoder_profile=encoder_profile,
+        originals_storage=originals_storage,
+        output_storage=output_storage,
+    )
+
+
+def build_services(
+    config: Dict[str, Any],
+    logger: Logger,
+    worker: bool = False,
+    defer_backend: bool = False,
+) -> Services:
+    """Создание объектов сервера без обращения к диску и БД.
+
+    Схема БД создаётся при первом запросе.
+    worker - отдельный процесс воркера, который не записывает статусы в БД.
+    defer_backend - не сравнивать бэкенды ресайза при создании.
+    """
+    db_manager = DatabaseManager()
+    # В процессе API бэкенд выбирает prewarm, не задерживая старт
+    image_processor = build_image_processor(
+        config,
+        logger,
+        db_manager,
+        defer_backend=defer_backend or (config["PREWARM"] and not worker),
+    )
+    job_queue = build_job_queue(config, db_manager)
+    job_runner = JobRunner(
+        job_queue,
+        image_processor,
+        logger,
+        db_manager=None if worker else db_manager,
+        run_worker=worker or config["WORKER_ENABLED"],
+        max_attempts=config["JOB_MAX_ATTEMPTS"],
+        lease_seconds=config["JOB_LEASE_SECONDS"],
+        backoff_base=config["JOB_BACKOFF_BASE"],
+        backoff_max=config["JOB_BACKOFF_MAX"],
+        scheduler=PriorityScheduler(
+            config["PROCESSING_SLOTS"],
+            config["PROCESSING_QUEUE_SIZE"],
+            config["PROCESSING_WAIT_TIMEOUT"],
+        ),
+    )
+
+    return Services(
+        db_manager,
+        image_processor.admission,
+        image_processor,
+        job_queue,
+        job_runner,
+        image_processor.originals_storage,
+        image_processor.output_storage,
+    )
+
+
+def prewarm(
+    services: Services, config: Dict[str, Any], logger: Logger, timer: StartupTimer
+) -> None:
+    """Прогрев до приёма трафика: схема БД, индекс случайной выборки,
+    плагины Pillow и выбор бэкенда ресайза"""
+    with timer.phase("database"):
+        services.db_manager.init_db()
+
+    with timer.phase("random_index"):
+        count = services.db_manager.load_random_index()
+        logger.info("Индекс случайной выборки: %s изображений", count)
+
+    with timer.phase("image_plugins"):
+        load_image_plugins()
+
+    if config["RESIZE_BACKEND"] == "auto":
+        with timer.phase("resize_backend"):
+            services.image_processor.backend = select_backend(
+                "auto",
+                services.admission,
+                (ImageProcessor.WIDTH, ImageProcessor.HEIGHT),
+                config["RESIZE_MODE"],
+                services.image_processor.encoder_profile,
+                logger,
+            )
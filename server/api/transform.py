@@ -0,0 +1,91 @@
+from PIL import Image, ExifTags
+
+# stretch - растянуть на всю рамку (без сохранения пропорций)
+# fit - вписать целиком и дополнить полями
+# crop - заполнить рамку и обрезать лишнее по центру
+RESIZE_MODES = ("stretch", "fit", "crop")
+
+# Значение EXIF Orientation -> операция, как в ImageOps.exif_transpose
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# При этих значениях ширина и высота меняются местами
+_SWAPPED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def get_orientation(image: Image.Image) -> int:
+    """Чтение EXIF Orientation из заголовка, без декодирования пикселей"""
+    try:
+        return int(image.getexif().get(ExifTags.Base.Orientation, 1))
+    except Exception:
+        return 1
+
+
+def source_frame(frame: tuple[int, int], orientation: int) -> tuple[int, int]:
+    """Размер рамки в координатах исходного (не повёрнутого) изображения"""
+    if orientation in _SWAPPED_ORIENTATIONS:
+        return frame[1], frame[0]
+    return frame
+
+
+def plan_resize(
+    size: tuple[int, int], frame: tuple[int, int], mode: str
+) -> tuple[tuple[int, int], tuple[float, float, float, float]]:
+    """Расчёт итогового размера и области исходника для Image.resize.
+
+    Область (box) позволяет сделать обрезку в том же проходе ресемплинга.
+    """
+    width, height = size
+    frame_width, frame_height = frame
+    box = (0.0, 0.0, float(width), float(height))
+
+    if mode == "stretch":
+        return frame, box
+
+    if mode == "fit":
+        scale = min(frame_width / width, frame_height / height)
+        target = (
+            max(1, round(width * scale)),
+            max(1, round(height * scale)),
+        )
+        return target, box
+
+    # crop: берём из центра исходника область с пропорциями рамки
+    scale = max(frame_width / width, frame_height / height)
+    crop_width = frame_width / scale
+    crop_height = frame_height / scale
+    # Из-за погрешности деления область может выйти за исходник
+    # на 1e-13, а Image.resize не принимает box за его границами
+    left = max(0.0, (width - crop_width) / 2)
+    top = max(0.0, (height - crop_height) / 2)
+    right = min(float(width), left + crop_width)
+    bottom = min(float(height), top + crop_height)
+    return frame, (left, top, right, bottom)
+
+
+def apply_orientation(image: Image.Image, orientation: int) -> Image.Image:
+    """Поворот уже уменьшенного изображения по EXIF"""
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    if method is None:
+        return image
+    return image.transpose(method)
+
+
+def pad_to_frame(
+    image: Image.Image, frame: tuple[int, int], color: str = "black"
+) -> Image.Image:
+    """Дополнение вписанного изображения полями до размера рамки"""
+    if image.size == frame:
+        return image
+    canvas = Image.new(image.mode, frame, color)
+    canvas.paste(
+        image, ((frame[0] - image.size[0]) // 2, (frame[1] - image.size[1]) // 2)
+    )
+    return canvas
@@ -0,0 +1,206 @@
+import io
+import os
+import hashlib
+import tempfile
+
+from pathlib import Path
+from typing import IO, BinaryIO, cast
+from dataclasses import dataclass
+from werkzeug.formparser import FormDataParser
+from storage.storage import Storage
+from utils.exceptions import ImageTooLargeError
+
+SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".webp", ".png"}
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class StoredUpload:
+    key: str
+    file_hash: str
+    size: int
+    # Содержимое файла, если оно поместилось в лимит памяти
+    data: bytes | None = None
+
+    def open_source(self) -> BinaryIO | None:
+        """Буфер для декодирования. None - читать из хранилища"""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return None
+
+
+def resolve_extension(filename: str | None, content_type: str | None) -> str:
+    """Определение расширения по имени файла или Content-Type"""
+    if filename:
+        suffix = Path(filename).suffix.lower()
+        if suffix in SUPPORTED_EXTENSIONS:
+            return suffix
+
+    if content_type:
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip())
+        if extension:
+            return extension
+
+    raise ValueError("Неподдерживаемый формат файла")
+
+
+class UploadWriter:
+    """Запись загрузки во временный файл хранилища с подсчётом хеша.
+
+    Каждый кусок сразу пишется во временный файл и добавляется в хеш.
+    finish() атомарно сохраняет файл под ключом <hash><extension>. Если
+    загрузка не больше memory_limit, её содержимое остаётся в памяти, чтобы
+    декодировать без повторного чтения с диска.
+    """
+
+    def __init__(
+        self, storage: Storage, max_bytes: int | None = None, memory_limit: int = 0
+    ):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.memory_limit = memory_limit
+        self.size = 0
+        self._hasher = hashlib.md5()
+        self._buffer: bytearray | None = bytearray() if memory_limit > 0 else None
+
+        # Для локального хранилища - та же папка, чтобы rename был атомарным
+        fd, tmp_name = tempfile.mkstemp(
+            dir=storage.staging_dir(), prefix=".upload-", suffix=".part"
+        )
+        self._tmp_path = Path(tmp_name)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> int:
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise ImageTooLargeError("Файл слишком большой")
+
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+        if self._buffer is not None:
+            if self.size <= self.memory_limit:
+                self._buffer.extend(chunk)
+            else:
+                self._buffer = None
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # werkzeug перематывает поток после части multipart, читать его не нужно
+        return 0
+
+    def finish(self, extension: str) -> StoredUpload:
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+            if self.size == 0:
+                raise ValueError("Пустой файл")
+
+            file_hash = self._hasher.hexdigest()
+            key = f"{file_hash}{extension}"
+
+            if self.storage.exists(key):
+                # Такой файл уже загружали
+                self._tmp_path.unlink()
+            else:
+                self.storage.put_file(key, self._tmp_path)
+
+        except BaseException:
+            self.discard()
+            raise
+
+        return StoredUpload(
+            key=key,
+            file_hash=file_hash,
+            size=self.size,
+            data=bytes(self._buffer) if self._buffer is not None else None,
+        )
+
+    def discard(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def store_upload(
+    stream: BinaryIO,
+    storage: Storage,
+    extension: str,
+    max_bytes: int | None = None,
+    memory_limit: int = 0,
+) -> StoredUpload:
+    """Потоковая запись тела запроса в хранилище оригиналов.
+
+    Тело читается один раз, каждый байт пишется на диск один раз.
+    """
+    writer = UploadWriter(storage, max_bytes, memory_limit)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+
+    return writer.finish(extension)
+
+
+def store_multipart_upload(
+    stream: BinaryIO,
+    mimetype: str,
+    content_length: int | None,
+    options: dict[str, str],
+    storage: Storage,
+    field: str = "file",
+    max_bytes: int | None = None,
+    memory_limit: int = 0,
+    max_form_memory_size: int | None = None,
+) -> StoredUpload:
+    """Загрузка из multipart поля field.
+
+    Части с файлами werkzeug пишет сразу в UploadWriter (stream_factory),
+    а не в свой временный файл, поэтому байты не копируются второй раз.
+    """
+    writers: list[UploadWriter] = []
+
+    def stream_factory(
+        total_content_length: int | None,
+        content_type: str | None,
+        filename: str | None,
+        content_length: int | None = None,
+    ) -> IO[bytes]:
+        writer = UploadWriter(storage, max_bytes, memory_limit)
+        writers.append(writer)
+        return cast(IO[bytes], writer)
+
+    parser = FormDataParser(
+        stream_factory=stream_factory,
+        max_form_memory_size=max_form_memory_size,
+        silent=False,
+    )
+    try:
+        _, _, files = parser.parse(stream, mimetype, content_length, options)
+
+        upload_file = files.get(field)
+        if upload_file is None:
+            raise ValueError(f"Поле {field} не найдено")
+
+        extension = resolve_extension(upload_file.filename, upload_file.content_type)
+        writer = cast(UploadWriter, upload_file.stream)
+        writers.remove(writer)
+        return writer.finish(extension)
+
+    finally:
+        # Остальные части запроса не сохраняются
+        for writer in writers:
+            writer.discard()
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+from pathlib import Path
+from collections import deque
+from typing import Iterator, TextIO, TYPE_CHECKING
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from config import config_dict
+from utils.logger_setup import setup_logger
+from database.database_manager import DatabaseManager, ImageStatus
+from api.upload import SUPPORTED_EXTENSIONS
+
+if TYPE_CHECKING:
+    from api.processor import ImageProcessor
+
+# ImageProcessor в каждом процессе пула, создаётся в _init_worker
+_processor: "ImageProcessor | None" = None
+
+
+def _init_worker(config: dict, nice: int) -> None:
+    global _processor
+    from api.services import build_image_processor
+
+    if nice:
+        os.nice(nice)
+    logger = setup_logger()
+    _processor = build_image_processor(config, logger, DatabaseManager())
+
+
+def _render(original_path: str) -> str:
+    assert _processor is not None, "_init_worker не вызван"
+    return _processor.process_and_save_image(original_path)
+
+
+def iter_db_items(
+    db_manager: DatabaseManager, after_id: int, include_errors: bool
+) -> Iterator[tuple[int, str]]:
+    """(id, original_path) из БД по возрастанию id"""
+    status = None if include_errors else ImageStatus.SUCCESS
+    for image in db_manager.iter_images(after_id, status):
+        yield image["id"], image["original_path"]
+
+
+def iter_originals_items(
+    originals_path: Path, done: set[str]
+) -> Iterator[tuple[int, str]]:
+    """(номер, имя файла) из ORIGINALS_PATH, без уже обработанных"""
+    with os.scandir(originals_path) as entries:
+        for number, entry in enumerate(entries):
+            if not entry.is_file() or entry.name in done:
+                continue
+            if Path(entry.name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            yield number, entry.name
+
+
+def count_originals(originals_path: Path) -> int:
+    with os.scandir(originals_path) as entries:
+        return sum(
+            1
+            for entry in entries
+            if entry.is_file()
+            and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
+
+class Checkpoint:
+    """Прогресс для продолжения после остановки.
+
+    Для БД хранится id, до которого всё обработано (задачи завершаются не
+    по порядку, поэтому отметка сдвигается только по непрерывному префиксу).
+    Для папки оригиналов - журнал имён обработанных файлов.
+    """
+
+    def __init__(self, path: Path, source: str):
+        self.path = path
+        self.source = source
+        self.last_id = 0
+        self.done: set[str] = set()
+        self._pending: deque[int] = deque()
+        self._completed: set[int] = set()
+        self._journal: TextIO | None = None
+
+    def load(self) -> None:
+        if self.source == "db":
+            if self.path.exists():
+                self.last_id = json.loads(self.path.read_text())["last_id"]
+        elif self.path.exists():
+            self.done = set(self.path.read_text().splitlines())
+
+    def open(self, resume: bool) -> None:
+        if self.source == "originals":
+            self._journal = open(self.path, "a" if resume else "w")
+
+    def submitted(self, item_id: int) -> None:
+        if self._journal is None:
+            self._pending.append(item_id)
+
+    def completed(self, item_id: int, name: str) -> None:
+        if self._journal is not None:
+            self._journal.write(f"{name}\n")
+            return
+
+        self._completed.add(item_id)
+        while self._pending and self._pending[0] in self._completed:
+            self._completed.remove(self._pending[0])
+            self.last_id = self._pending.popleft()
+
+    def save(self) -> None:
+        if self._journal is not None:
+            self._journal.flush()
+            return
+
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"last_id": self.last_id}))
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        self.save()
+        if self._journal is not None:
+            self._journal.close()
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Перерисовка всей библиотеки без HTTP: после смены размеров, "
+        "качества JPEG или модели рамки"
+    )
+    parser.add_argument(
+        "--source",
+        choices=("db", "originals"),
+        default="db",
+        help="обходить записи БД или файлы в ORIGINALS_PATH",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="процессов в пуле"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=Path("batch_checkpoint"),
+        help="файл прогресса для продолжения",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="продолжить с места остановки"
+    )
+    parser.add_argument(
+        "--include-errors",
+        action="store_true",
+        help="обрабатывать и записи со статусом error (только для --source db)",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=0,
+        help="не больше N изображений в секунду (0 - без ограничения)",
+    )
+    parser.add_argument(
+        "--nice", type=int, default=10, help="понижение приоритета воркеров"
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=5, help="секунд между отчётами"
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    config = config_dict()
+    logger = setup_logger()
+    db_manager = DatabaseManager()
+
+    if config["RESIZE_BACKEND"] == "auto":
+        # Бэкенды сравниваются один раз, а не в каждом процессе пула
+        from api.services import build_image_processor
+
+        backend = build_image_processor(config, logger, db_manager).backend
+        config = {**config, "RESIZE_BACKEND": backend.name}
+
+    checkpoint = Checkpoint(args.checkpoint, args.source)
+    if args.resume:
+        checkpoint.load()
+
+    if args.source == "db":
+        status = None if args.include_errors else ImageStatus.SUCCESS
+        total = db_manager.count_images(status, after_id=checkpoint.last_id)
+        items = iter_db_items(db_manager, checkpoint.last_id, args.include_errors)
+    else:
+        if config["STORAGE_BACKEND"] != "local" or not config["ORIGINALS_PATH"]:
+            logger.error("--source originals работает только с локальной папкой")
+            return 1
+        originals_path = Path(config["ORIGINALS_PATH"])
+        total = count_originals(originals_path) - len(checkpoint.done)
+        items = iter_originals_items(originals_path, checkpoint.done)
+
+    checkpoint.open(args.resume)
+
+    # В работе не больше двух задач на процесс: список файлов не копится
+    max_in_flight = args.workers * 2
+    min_interval = 1 / args.max_rate if args.max_rate > 0 else 0
+
+    started = time.perf_counter()
+    last_report = started
+    last_submit = 0.0
+    processed = failed = 0
+    in_flight: dict = {}
+
+    def report(final: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        done = processed + failed
+        rate = done / elapsed if elapsed > 0 else 0
+        remaining = max(0, total - done)
+        eta = format_eta(remaining / rate) if rate > 0 else "?"
+        print(
+            f"{'Готово' if final else 'Прогресс'}: {done}/{total} "
+            f"(ошибок: {failed}), {rate:.1f} изобр./с, осталось ~{eta}",
+            flush=True,
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(config, args.nice),
+    ) as executor:
+        try:
+            exhausted = False
+            while not exhausted or in_flight:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+
+                    item_id, original_path = item
+                    if min_interval:
+                        delay = last_submit + min_interval - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    last_submit = time.perf_counter()
+
+                    future = executor.submit(_render, original_path)
+                    in_flight[future] = (item_id, original_path)
+                    checkpoint.submitted(item_id)
+
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item_id, original_path = in_flight.pop(future)
+                    try:
+                        future.result()
+                        processed += 1
+                    except Exception as e:
+                        failed += 1
+                        logger.error("Не удалось обработать %s: %s", original_path, e)
+                    # Ошибку тоже отмечаем, чтобы не застрять на битом файле
+                    checkpoint.completed(item_id, original_path)
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_interval:
+                    checkpoint.save()
+                    report()
+                    last_report = now
+
+        except KeyboardInterrupt:
+            print("Остановлено, прогресс сохранён. Продолжить: --resume")
+            for future in in_flight:
+                future.cancel()
+        finally:
+            checkpoint.close()
+
+    report(final=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
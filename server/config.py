@@ -0,0 +1,67 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Config:
+    ORIGINALS_PATH = os.getenv("ORIGINALS_PATH")
+    OUTPUT_PATH = os.getenv("OUTPUT_PATH")
+    SERVER_HOST = os.getenv("SERVER_HOST")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", 5001))
+    # Бюджеты памяти на декодирование: одно изображение и все одновременно
+    DECODE_IMAGE_BUDGET_MB = int(os.getenv("DECODE_IMAGE_BUDGET_MB", 256))
+    DECODE_MEMORY_BUDGET_MB = int(os.getenv("DECODE_MEMORY_BUDGET_MB", 1024))
+    DECODE_WAIT_TIMEOUT = float(os.getenv("DECODE_WAIT_TIMEOUT", 30))
+    # stretch, fit или crop
+    RESIZE_MODE = os.getenv("RESIZE_MODE", "stretch")
+    STRIP_METADATA = os.getenv("STRIP_METADATA", "1") == "1"
+    # pillow, vips или auto (самый быстрый из установленных)
+    RESIZE_BACKEND = os.getenv("RESIZE_BACKEND", "auto")
+    # default, fast, progressive или quality
+    JPEG_PROFILE = os.getenv("JPEG_PROFILE", "default")
+    # Ограничение размера загрузки и сколько из неё держать в памяти
+    MAX_CONTENT_LENGTH = int(os.getenv("UPLOAD_MAX_MB", 64)) * 1024 * 1024
+    UPLOAD_MEMORY_LIMIT_MB = int(os.getenv("UPLOAD_MEMORY_LIMIT_MB", 16))
+    # Повторы задач: число попыток, аренда и экспоненциальная задержка
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+    JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 5))
+    JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 600))
+    # Прогрев БД, индекса и бэкенда ресайза до готовности (/health/ready)
+    PREWARM = os.getenv("PREWARM", "1") == "1"
+    # Хранилище оригиналов и результатов: local или s3 (AWS S3, MinIO)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+    S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+    S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+    S3_REGION = os.getenv("S3_REGION")
+    S3_ORIGINALS_PREFIX = os.getenv("S3_ORIGINALS_PREFIX", "originals/")
+    S3_OUTPUT_PREFIX = os.getenv("S3_OUTPUT_PREFIX", "processed/")
+    # Очередь задач: sqlite (один узел) или redis (несколько узлов)
+    JOB_QUEUE = os.getenv("JOB_QUEUE", "sqlite")
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Выполняет ли процесс API задачи из очереди сам и сколькими потоками
+    WORKER_ENABLED = os.getenv("WORKER_ENABLED", "1") == "1"
+    WORKER_THREADS = int(os.getenv("WORKER_THREADS", 1))
+    # Лимиты на клиента (X-Client-Id или IP): запросов в секунду и всплеск.
+    # interactive - запросы бота, bulk - загрузки от watcher. 0 - без лимита
+    RATE_LIMIT_INTERACTIVE = float(os.getenv("RATE_LIMIT_INTERACTIVE", 10))
+    RATE_LIMIT_INTERACTIVE_BURST = float(os.getenv("RATE_LIMIT_INTERACTIVE_BURST", 20))
+    RATE_LIMIT_BULK = float(os.getenv("RATE_LIMIT_BULK", 20))
+    RATE_LIMIT_BULK_BURST = float(os.getenv("RATE_LIMIT_BULK_BURST", 50))
+    # Одновременные запросы каждого класса и сколько ждать свободного места
+    INTERACTIVE_CONCURRENCY = int(os.getenv("INTERACTIVE_CONCURRENCY", 16))
+    BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 4))
+    CONCURRENCY_WAIT_TIMEOUT = float(os.getenv("CONCURRENCY_WAIT_TIMEOUT", 0.5))
+    # Одновременные ресайзы, длина очереди к ним и время ожидания слота
+    PROCESSING_SLOTS = int(os.getenv("PROCESSING_SLOTS", os.cpu_count() or 1))
+    PROCESSING_QUEUE_SIZE = int(os.getenv("PROCESSING_QUEUE_SIZE", 32))
+    PROCESSING_WAIT_TIMEOUT = float(os.getenv("PROCESSING_WAIT_TIMEOUT", 10))
+
+
+def config_dict() -> dict:
+    """Настройки в виде словаря, как app.config у Flask"""
+    return {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
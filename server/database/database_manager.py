@@ -1,12 +1,16 @@
 import os
+import time
+import random
 import sqlite3
+import threading
 import hashlib
 
 from enum import Enum
+from typing import Iterator
 from pathlib import Path
 from utils.exceptions import ImageProcessingError, DatabaseError, ImageNotFoundError
 
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 
 SERVER_PORT = int(os.getenv("SERVER_PORT", 5001))
 SERVER_HOST = os.getenv("SERVER_HOST")
@@ -16,6 +20,9 @@ SERVER_PATH = f"{SERVER_HOST}:{SERVER_PORT}"
 
 # TODO: SQLAlchemy?
 
+# Как долго список id для случайной выборки считается актуальным
+RANDOM_INDEX_TTL = float(os.getenv("RANDOM_INDEX_TTL", 30))
+
 
 class ImageStatus(Enum):
     SUCCESS = "success"
@@ -23,15 +30,33 @@ class ImageStatus(Enum):
     PROCESSING = "processing"
 
 
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class DatabaseManager:
 
     def __init__(self):
-        self.db_path = "image_processing.db"
-        self.init_db()
+        self.db_path = os.getenv("DB_PATH", "image_processing.db")
+        # Схема создаётся при первом обращении к БД или в init_db
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # id успешно обработанных изображений для случайной выборки и их
+        # позиции в списке, чтобы добавлять и удалять id без перезагрузки
+        self._random_ids: list[int] = []
+        self._random_positions: dict[int, int] = {}
+        self._random_loaded_at: float | None = None
+        self._random_lock = threading.Lock()
 
     @contextmanager
     def get_connection(self):
         """Контекстный менеджер для соединения с БД"""
+        if not self._schema_ready:
+            self.init_db()
+
         conn = None
         try:
             conn = sqlite3.connect(self.db_path)
@@ -44,22 +69,54 @@ class DatabaseManager:
 
     def init_db(self) -> None:
         """Инициализация базы данных"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS processed_images (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    original_path TEXT UNIQUE,
-                    file_hash TEXT UNIQUE,
-                    status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processed_at TIMESTAMP,
-                    error_message TEXT
-                )
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            try:
+                with closing(sqlite3.connect(self.db_path)) as conn:
+                    self._create_schema(conn)
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Ошибка при создании схемы БД: {e}")
+            self._schema_ready = True
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        cursor = conn.cursor()
+        cursor.execute(
             """
+            CREATE TABLE IF NOT EXISTS processed_images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_path TEXT UNIQUE,
+                file_hash TEXT UNIQUE,
+                status TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP,
+                error_message TEXT
             )
-            conn.commit()
+        """
+        )
+        # Очередь задач на ресайз: попытки, аренда (lease) и backoff
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                file_hash TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL
+            )
+        """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_image_jobs_due
+            ON image_jobs (state, next_attempt_at)
+        """
+        )
+        conn.commit()
 
     @staticmethod
     def create_file_hash(file_path: Path) -> str:
@@ -99,8 +156,19 @@ class DatabaseManager:
 
             if cursor.rowcount == 0:
                 raise ImageNotFoundError(f"Изображение с хешем {file_hash} не найдено")
+
+            image_id = None
+            if status == ImageStatus.SUCCESS:
+                cursor.execute(
+                    "SELECT id FROM processed_images WHERE file_hash = ?", (file_hash,)
+                )
+                image_id = cursor.fetchone()[0]
             conn.commit()
 
+        # Прочие статусы индекс не трогают: выборка проверяет статус сама
+        if image_id is not None:
+            self._random_index_add(image_id)
+
     def get_file_hash(self, file_path: str | Path) -> str:
         """Получение хеша по file_path."""
         with self.get_connection() as conn:
@@ -145,22 +213,54 @@ class DatabaseManager:
 
             return ImageStatus(result[0])
 
-    def process_image(self, file_path: Path) -> str:
-        """Обработка фотографии и сохранение информации в базу данных."""
-        file_hash = self.create_file_hash(file_path)
-        if self.get_image_status(file_hash) == ImageStatus.SUCCESS:
-            return file_hash
+    def process_image(self, file_path: Path, file_hash: str | None = None) -> str:
+        """Обработка фотографии и сохранение информации в базу данных.
+
+        Если file_hash уже посчитан (например, при загрузке), файл не читается.
+        """
+        if file_hash is None:
+            file_hash = self.create_file_hash(file_path)
 
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                INSERT INTO processed_images 
-                (original_path, file_hash, status, created_at)
-                VALUES (?, ?, ?, datetime('now'))
-            """,
-                (str(file_path), file_hash, ImageStatus.SUCCESS.value),
+                "SELECT file_hash FROM processed_images WHERE original_path = ?",
+                (str(file_path),),
             )
+            row = cursor.fetchone()
+
+            if row is None:
+                cursor.execute(
+                    """
+                    INSERT OR IGNORE INTO processed_images 
+                    (original_path, file_hash, status, created_at)
+                    VALUES (?, ?, ?, datetime('now'))
+                """,
+                    (str(file_path), file_hash, ImageStatus.PROCESSING.value),
+                )
+                # Такое содержимое уже записано под другим путём
+                if cursor.rowcount == 0:
+                    raise ValueError(
+                        f"Изображение с таким содержимым уже есть: {file_hash}"
+                    )
+            elif row[0] != file_hash:
+                # По этому пути теперь другой файл: запись переходит на новый
+                # hash, задача прежнего содержимого больше не нужна
+                try:
+                    cursor.execute(
+                        """
+                        UPDATE processed_images
+                        SET file_hash = ?, status = ?, error_message = NULL,
+                            processed_at = NULL, created_at = datetime('now')
+                        WHERE original_path = ?
+                    """,
+                        (file_hash, ImageStatus.PROCESSING.value, str(file_path)),
+                    )
+                except sqlite3.IntegrityError:
+                    raise ValueError(
+                        f"Изображение с таким содержимым уже есть: {file_hash}"
+                    )
+                cursor.execute("DELETE FROM image_jobs WHERE file_hash = ?", (row[0],))
             conn.commit()
 
         return file_hash
@@ -170,16 +270,163 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "DELETE FROM processed_images WHERE file_hash = ?", (file_hash,)
+                "SELECT id FROM processed_images WHERE file_hash = ?", (file_hash,)
             )
-            if cursor.rowcount == 0:
+            row = cursor.fetchone()
+            if row is None:
                 raise ImageNotFoundError(f"Изображение с хешем {file_hash} не найдено")
+            cursor.execute(
+                "DELETE FROM processed_images WHERE file_hash = ?", (file_hash,)
+            )
+            cursor.execute("DELETE FROM image_jobs WHERE file_hash = ?", (file_hash,))
             conn.commit()
 
+        self._random_index_remove(row[0])
+
+    def count_images(
+        self, status: ImageStatus | None = None, after_id: int = 0
+    ) -> int:
+        """Количество изображений с id больше after_id,
+        опционально с указанным статусом"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if status is None:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM processed_images WHERE id > ?",
+                    (after_id,),
+                )
+            else:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM processed_images WHERE id > ? AND status = ?",
+                    (after_id, status.value),
+                )
+            return cursor.fetchone()[0]
+
+    def iter_images(
+        self,
+        after_id: int = 0,
+        status: ImageStatus | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[dict]:
+        """Обход изображений по возрастанию id порциями, без загрузки всей таблицы"""
+        last_id = after_id
+        while True:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if status is None:
+                    cursor.execute(
+                        """
+                        SELECT id, original_path, file_hash FROM processed_images
+                        WHERE id > ? ORDER BY id LIMIT ?
+                    """,
+                        (last_id, batch_size),
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        SELECT id, original_path, file_hash FROM processed_images
+                        WHERE id > ? AND status = ? ORDER BY id LIMIT ?
+                    """,
+                        (last_id, status.value, batch_size),
+                    )
+                rows = cursor.fetchall()
+
+            if not rows:
+                return
+
+            for row_id, original_path, file_hash in rows:
+                yield {
+                    "id": row_id,
+                    "original_path": original_path,
+                    "file_hash": file_hash,
+                }
+            last_id = rows[-1][0]
+
+    def load_random_index(self) -> int:
+        """Загрузка id успешно обработанных изображений для случайной выборки"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id FROM processed_images WHERE status = ?",
+                (ImageStatus.SUCCESS.value,),
+            )
+            random_ids = [row[0] for row in cursor.fetchall()]
+
+        with self._random_lock:
+            self._random_ids = random_ids
+            self._random_positions = {
+                image_id: position for position, image_id in enumerate(random_ids)
+            }
+            self._random_loaded_at = time.monotonic()
+        return len(random_ids)
+
+    def _random_index_add(self, image_id: int) -> None:
+        with self._random_lock:
+            # Незагруженный индекс прочитает запись сам
+            if self._random_loaded_at is None or image_id in self._random_positions:
+                return
+            self._random_positions[image_id] = len(self._random_ids)
+            self._random_ids.append(image_id)
+
+    def _random_index_remove(self, image_id: int) -> None:
+        with self._random_lock:
+            position = self._random_positions.pop(image_id, None)
+            if position is None:
+                return
+            # На место удалённого встаёт последний id
+            last_id = self._random_ids.pop()
+            if position < len(self._random_ids):
+                self._random_ids[position] = last_id
+                self._random_positions[last_id] = position
+
+    def _random_choice(self) -> int | None:
+        with self._random_lock:
+            return random.choice(self._random_ids) if self._random_ids else None
+
+    def _random_index_expired(self) -> bool:
+        return (
+            self._random_loaded_at is None
+            or time.monotonic() - self._random_loaded_at > RANDOM_INDEX_TTL
+        )
+
     def get_random_image(self) -> dict | None:
         try:
+            if self._random_index_expired():
+                self.load_random_index()
+
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                result = None
+
+                # Выбор по id из индекса вместо ORDER BY RANDOM() по всей таблице
+                image_id = self._random_choice()
+                if image_id is not None:
+                    cursor.execute(
+                        """
+                        SELECT original_path, file_hash, status, created_at,
+                               processed_at
+                        FROM processed_images
+                        WHERE id = ? AND status = ?
+                    """,
+                        (image_id, ImageStatus.SUCCESS.value),
+                    )
+                    result = cursor.fetchone()
+
+                if result:
+                    return {
+                        "original_path": result[0],
+                        "file_hash": result[1],
+                        "status": result[2],
+                        "created_at": result[3],
+                        "processed_at": result[4],
+                    }
+
+                # Запись удалили или заменили (возможно, в другом процессе):
+                # убираем её id, а пустой индекс перечитаем
+                if image_id is not None:
+                    self._random_index_remove(image_id)
+                else:
+                    self._random_loaded_at = None
                 cursor.execute(
                     """
                     SELECT original_path, file_hash, status, created_at, processed_at
@@ -205,3 +452,264 @@ class DatabaseManager:
 
         except sqlite3.Error as e:
             raise DatabaseError(f"Ошибка при получении случайной фотографии: {str(e)}")
+
+    # Задачи
+
+    def enqueue_job(self, file_hash: str, reset: bool = False) -> JobState:
+        """Постановка задачи в очередь. Существующая задача не меняется,
+        если не указан reset."""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if reset:
+                cursor.execute(
+                    """
+                    INSERT INTO image_jobs (file_hash, state, updated_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(file_hash) DO UPDATE SET
+                        state = excluded.state,
+                        attempts = 0,
+                        lease_owner = NULL,
+                        lease_expires_at = NULL,
+                        next_attempt_at = 0,
+                        last_error = NULL,
+                        updated_at = excluded.updated_at
+                """,
+                    (file_hash, JobState.QUEUED.value, now),
+                )
+            else:
+                cursor.execute(
+                    """
+                    INSERT OR IGNORE INTO image_jobs (file_hash, state, updated_at)
+                    VALUES (?, ?, ?)
+                """,
+                    (file_hash, JobState.QUEUED.value, now),
+                )
+            cursor.execute(
+                "SELECT state FROM image_jobs WHERE file_hash = ?", (file_hash,)
+            )
+            result = cursor.fetchone()
+            conn.commit()
+
+        return JobState(result[0])
+
+    def get_job(self, file_hash: str) -> dict | None:
+        """Состояние задачи"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT state, attempts, lease_owner, lease_expires_at,
+                       next_attempt_at, last_error
+                FROM image_jobs WHERE file_hash = ?
+            """,
+                (file_hash,),
+            )
+            result = cursor.fetchone()
+
+        if not result:
+            return None
+
+        return {
+            "file_hash": file_hash,
+            "state": JobState(result[0]),
+            "attempts": result[1],
+            "lease_owner": result[2],
+            "lease_expires_at": result[3],
+            "next_attempt_at": result[4],
+            "last_error": result[5],
+        }
+
+    def claim_job(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        """Захват задачи: из очереди (если подошло время) или с истёкшей арендой"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs
+                SET state = ?, attempts = attempts + 1, lease_owner = ?,
+                    lease_expires_at = ?, updated_at = ?
+                WHERE file_hash = ?
+                  AND ((state = ? AND next_attempt_at <= ?)
+                       OR (state = ? AND lease_expires_at < ?))
+            """,
+                (
+                    JobState.RUNNING.value,
+                    owner,
+                    now + lease_seconds,
+                    now,
+                    file_hash,
+                    JobState.QUEUED.value,
+                    now,
+                    JobState.RUNNING.value,
+                    now,
+                ),
+            )
+            claimed = cursor.rowcount == 1
+            conn.commit()
+
+        return claimed
+
+    def claim_next_job(self, owner: str, lease_seconds: float) -> dict | None:
+        """Захват следующей задачи, которую пора выполнять"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT j.file_hash, p.original_path
+                FROM image_jobs j
+                JOIN processed_images p ON p.file_hash = j.file_hash
+                WHERE j.state = ? AND j.next_attempt_at <= ?
+                ORDER BY j.next_attempt_at
+                LIMIT 10
+            """,
+                (JobState.QUEUED.value, time.time()),
+            )
+            candidates = cursor.fetchall()
+
+        # Задачу мог забрать другой воркер, тогда пробуем следующую
+        for file_hash, original_path in candidates:
+            if self.claim_job(file_hash, owner, lease_seconds):
+                return {"file_hash": file_hash, "original_path": original_path}
+
+        return None
+
+    def heartbeat_job(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        """Продление аренды задачи. False - аренду забрал кто-то другой"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs SET lease_expires_at = ?, updated_at = ?
+                WHERE file_hash = ? AND state = ? AND lease_owner = ?
+            """,
+                (now + lease_seconds, now, file_hash, JobState.RUNNING.value, owner),
+            )
+            extended = cursor.rowcount == 1
+            conn.commit()
+
+        return extended
+
+    def complete_job(self, file_hash: str, owner: str) -> None:
+        """Успешное завершение задачи"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs
+                SET state = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    last_error = NULL, updated_at = ?
+                WHERE file_hash = ? AND lease_owner = ?
+            """,
+                (JobState.DONE.value, time.time(), file_hash, owner),
+            )
+            conn.commit()
+
+    def fail_job(
+        self,
+        file_hash: str,
+        owner: str,
+        error_message: str,
+        retry: bool,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> JobState:
+        """Ошибка задачи: повтор с экспоненциальной задержкой или окончательный отказ"""
+        job = self.get_job(file_hash)
+        if job is None:
+            raise ImageNotFoundError(f"Задача для {file_hash} не найдена")
+
+        now = time.time()
+        if retry and job["attempts"] < max_attempts:
+            state = JobState.QUEUED
+            delay = min(backoff_max, backoff_base * 2 ** (job["attempts"] - 1))
+            next_attempt_at = now + delay
+        else:
+            state = JobState.FAILED
+            next_attempt_at = now
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs
+                SET state = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    next_attempt_at = ?, last_error = ?, updated_at = ?
+                WHERE file_hash = ? AND lease_owner = ?
+            """,
+                (state.value, next_attempt_at, error_message, now, file_hash, owner),
+            )
+            conn.commit()
+
+        return state
+
+    def delete_job(self, file_hash: str) -> None:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM image_jobs WHERE file_hash = ?", (file_hash,))
+            conn.commit()
+
+    def release_job(self, file_hash: str, owner: str, delay: float) -> None:
+        """Возврат задачи в очередь с отменой попытки, засчитанной при захвате"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs
+                SET state = ?, attempts = MAX(attempts - 1, 0), lease_owner = NULL,
+                    lease_expires_at = NULL, next_attempt_at = ?, updated_at = ?
+                WHERE file_hash = ? AND lease_owner = ?
+            """,
+                (JobState.QUEUED.value, now + delay, now, file_hash, owner),
+            )
+            conn.commit()
+
+    def recover_expired_jobs(self) -> int:
+        """Возврат в очередь задач, чья аренда истекла (воркер упал)"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE image_jobs
+                SET state = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    next_attempt_at = ?, updated_at = ?
+                WHERE state = ? AND lease_expires_at < ?
+            """,
+                (JobState.QUEUED.value, now, now, JobState.RUNNING.value, now),
+            )
+            recovered = cursor.rowcount
+            conn.commit()
+
+        return recovered
+
+    def recover_stale_images(self) -> int:
+        """Разовая сверка при старте: задачи для изображений, зависших
+        в PROCESSING, и удаление задач без изображения"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Изображения, зависшие в PROCESSING до появления таблицы задач
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO image_jobs (file_hash, state, updated_at)
+                SELECT file_hash, ?, ? FROM processed_images WHERE status = ?
+            """,
+                (JobState.QUEUED.value, now, ImageStatus.PROCESSING.value),
+            )
+            recovered = cursor.rowcount
+            # Задачи без изображения никто не выполнит: claim_next_job
+            # выбирает только задачи с записью в processed_images
+            cursor.execute(
+                """
+                DELETE FROM image_jobs
+                WHERE file_hash NOT IN (SELECT file_hash FROM processed_images)
+            """
+            )
+            conn.commit()
+
+        return recovered
@@ -0,0 +1,382 @@
+import json
+import time
+
+from abc import ABC, abstractmethod
+from database.database_manager import DatabaseManager, ImageStatus, JobState
+
+
+class JobQueue(ABC):
+    """Очередь задач на ресайз с арендой (lease) и повторами"""
+
+    # Один узел: задачу можно выполнить прямо в обработчике запроса
+    inline = True
+
+    @abstractmethod
+    def enqueue(
+        self, file_hash: str, original_path: str, reset: bool = False
+    ) -> JobState: ...
+
+    @abstractmethod
+    def get(self, file_hash: str) -> dict | None: ...
+
+    @abstractmethod
+    def claim(self, file_hash: str, owner: str, lease_seconds: float) -> bool: ...
+
+    @abstractmethod
+    def claim_next(self, owner: str, lease_seconds: float) -> dict | None:
+        """Следующая задача: {"file_hash", "original_path"}"""
+
+    @abstractmethod
+    def heartbeat(self, file_hash: str, owner: str, lease_seconds: float) -> bool: ...
+
+    @abstractmethod
+    def complete(self, file_hash: str, owner: str) -> None: ...
+
+    @abstractmethod
+    def fail(
+        self,
+        file_hash: str,
+        owner: str,
+        error_message: str,
+        retry: bool,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> JobState: ...
+
+    @abstractmethod
+    def release(self, file_hash: str, owner: str, delay: float) -> None:
+        """Возврат захваченной задачи в очередь без траты попытки:
+        задача не выполнялась, например не хватило мощности"""
+
+    @abstractmethod
+    def delete(self, file_hash: str) -> None:
+        """Удаление задачи вместе с изображением"""
+
+    @abstractmethod
+    def recover(self) -> int:
+        """Возврат в очередь задач с истёкшей арендой"""
+
+    def recover_stale(self) -> int:
+        """Разовая сверка задач с изображениями при старте"""
+        return 0
+
+    @abstractmethod
+    def publish_status(
+        self, file_hash: str, status: ImageStatus, error_message: str | None = None
+    ) -> None:
+        """Статус изображения для processed_images"""
+
+    def drain_statuses(self, limit: int = 100) -> list[tuple]:
+        """Статусы от воркеров других узлов, которые надо записать в БД"""
+        return []
+
+
+class SqliteJobQueue(JobQueue):
+    """Очередь в таблице image_jobs - для одного узла"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def enqueue(
+        self, file_hash: str, original_path: str, reset: bool = False
+    ) -> JobState:
+        # original_path уже записан в processed_images
+        return self.db_manager.enqueue_job(file_hash, reset)
+
+    def get(self, file_hash: str) -> dict | None:
+        return self.db_manager.get_job(file_hash)
+
+    def claim(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        return self.db_manager.claim_job(file_hash, owner, lease_seconds)
+
+    def claim_next(self, owner: str, lease_seconds: float) -> dict | None:
+        return self.db_manager.claim_next_job(owner, lease_seconds)
+
+    def heartbeat(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        return self.db_manager.heartbeat_job(file_hash, owner, lease_seconds)
+
+    def complete(self, file_hash: str, owner: str) -> None:
+        self.db_manager.complete_job(file_hash, owner)
+
+    def fail(
+        self,
+        file_hash: str,
+        owner: str,
+        error_message: str,
+        retry: bool,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> JobState:
+        return self.db_manager.fail_job(
+            file_hash,
+            owner,
+            error_message,
+            retry,
+            max_attempts,
+            backoff_base,
+            backoff_max,
+        )
+
+    def release(self, file_hash: str, owner: str, delay: float) -> None:
+        self.db_manager.release_job(file_hash, owner, delay)
+
+    def delete(self, file_hash: str) -> None:
+        self.db_manager.delete_job(file_hash)
+
+    def recover(self) -> int:
+        return self.db_manager.recover_expired_jobs()
+
+    def recover_stale(self) -> int:
+        return self.db_manager.recover_stale_images()
+
+    def publish_status(
+        self, file_hash: str, status: ImageStatus, error_message: str | None = None
+    ) -> None:
+        self.db_manager.update_status(file_hash, status, error_message)
+
+
+# Скрипты выполняются в Redis атомарно, поэтому захват задачи двумя
+# воркерами одновременно невозможен
+_ENQUEUE_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if state and ARGV[4] ~= '1' then
+    return state
+end
+redis.call('HSET', KEYS[1], 'state', 'queued', 'attempts', 0,
+    'original_path', ARGV[2], 'next_attempt_at', ARGV[3], 'last_error', '',
+    'lease_owner', '', 'lease_expires_at', 0)
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 'queued'
+"""
+
+_CLAIM_SCRIPT = """
+local job = redis.call('HMGET', KEYS[1], 'state', 'next_attempt_at', 'lease_expires_at')
+local now = tonumber(ARGV[3])
+if job[1] == 'queued' then
+    if tonumber(job[2]) > now then return 0 end
+elseif job[1] == 'running' then
+    if tonumber(job[3]) >= now then return 0 end
+else
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+redis.call('HSET', KEYS[1], 'state', 'running', 'lease_owner', ARGV[2],
+    'lease_expires_at', ARGV[4])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+return 1
+"""
+
+_HEARTBEAT_SCRIPT = """
+local job = redis.call('HMGET', KEYS[1], 'state', 'lease_owner')
+if job[1] ~= 'running' or job[2] ~= ARGV[2] then return 0 end
+redis.call('HSET', KEYS[1], 'lease_expires_at', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+_FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[2] then return 0 end
+redis.call('HSET', KEYS[1], 'state', ARGV[3], 'lease_owner', '',
+    'lease_expires_at', 0, 'next_attempt_at', ARGV[4], 'last_error', ARGV[5])
+redis.call('ZREM', KEYS[3], ARGV[1])
+if ARGV[3] == 'queued' then
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+end
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[2] then return 0 end
+local attempts = tonumber(redis.call('HGET', KEYS[1], 'attempts'))
+redis.call('HSET', KEYS[1], 'state', 'queued', 'attempts', math.max(attempts - 1, 0),
+    'lease_owner', '', 'lease_expires_at', 0, 'next_attempt_at', ARGV[3])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+_RECOVER_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[1])
+for _, file_hash in ipairs(expired) do
+    redis.call('HSET', ARGV[2] .. file_hash, 'state', 'queued', 'lease_owner', '',
+        'lease_expires_at', 0, 'next_attempt_at', ARGV[1])
+    redis.call('ZREM', KEYS[2], file_hash)
+    redis.call('ZADD', KEYS[1], ARGV[1], file_hash)
+end
+return #expired
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """Очередь в Redis (или совместимом сервере) - для нескольких узлов.
+
+    Воркеры других узлов не видят SQLite, поэтому статусы изображений
+    складываются в список и записываются в БД процессом API.
+    """
+
+    inline = False
+
+    def __init__(self, url: str, prefix: str = "ramochka:"):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("Для JOB_QUEUE=redis нужен пакет redis")
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.due_key = f"{prefix}jobs:due"
+        self.leases_key = f"{prefix}jobs:leases"
+        self.statuses_key = f"{prefix}jobs:statuses"
+        self._enqueue = self.client.register_script(_ENQUEUE_SCRIPT)
+        self._claim = self.client.register_script(_CLAIM_SCRIPT)
+        self._heartbeat = self.client.register_script(_HEARTBEAT_SCRIPT)
+        self._finish = self.client.register_script(_FINISH_SCRIPT)
+        self._release = self.client.register_script(_RELEASE_SCRIPT)
+        self._recover = self.client.register_script(_RECOVER_SCRIPT)
+
+    def job_key(self, file_hash: str) -> str:
+        return f"{self.prefix}job:{file_hash}"
+
+    def _keys(self, file_hash: str) -> list[str]:
+        return [self.job_key(file_hash), self.due_key, self.leases_key]
+
+    def enqueue(
+        self, file_hash: str, original_path: str, reset: bool = False
+    ) -> JobState:
+        state = self._enqueue(
+            keys=self._keys(file_hash),
+            args=[file_hash, original_path, time.time(), "1" if reset else "0"],
+        )
+        return JobState(state)
+
+    def get(self, file_hash: str) -> dict | None:
+        job = self.client.hgetall(self.job_key(file_hash))
+        if not job:
+            return None
+
+        return {
+            "file_hash": file_hash,
+            "state": JobState(job["state"]),
+            "attempts": int(job["attempts"]),
+            "lease_owner": job["lease_owner"] or None,
+            "lease_expires_at": float(job["lease_expires_at"]) or None,
+            "next_attempt_at": float(job["next_attempt_at"]),
+            "last_error": job["last_error"] or None,
+            "original_path": job["original_path"],
+        }
+
+    def claim(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        now = time.time()
+        claimed = self._claim(
+            keys=self._keys(file_hash),
+            args=[file_hash, owner, now, now + lease_seconds],
+        )
+        return claimed == 1
+
+    def claim_next(self, owner: str, lease_seconds: float) -> dict | None:
+        candidates = self.client.zrangebyscore(
+            self.due_key, "-inf", time.time(), start=0, num=10
+        )
+        # Задачу мог забрать другой воркер, тогда пробуем следующую
+        for file_hash in candidates:
+            if self.claim(file_hash, owner, lease_seconds):
+                original_path = self.client.hget(
+                    self.job_key(file_hash), "original_path"
+                )
+                return {"file_hash": file_hash, "original_path": original_path}
+
+        return None
+
+    def heartbeat(self, file_hash: str, owner: str, lease_seconds: float) -> bool:
+        extended = self._heartbeat(
+            keys=[self.job_key(file_hash), self.leases_key],
+            args=[file_hash, owner, time.time() + lease_seconds],
+        )
+        return extended == 1
+
+    def complete(self, file_hash: str, owner: str) -> None:
+        self._finish(
+            keys=self._keys(file_hash),
+            args=[file_hash, owner, JobState.DONE.value, time.time(), ""],
+        )
+
+    def fail(
+        self,
+        file_hash: str,
+        owner: str,
+        error_message: str,
+        retry: bool,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> JobState:
+        attempts = int(self.client.hget(self.job_key(file_hash), "attempts") or 0)
+
+        now = time.time()
+        if retry and attempts < max_attempts:
+            state = JobState.QUEUED
+            next_attempt_at = now + min(backoff_max, backoff_base * 2 ** (attempts - 1))
+        else:
+            state = JobState.FAILED
+            next_attempt_at = now
+
+        self._finish(
+            keys=self._keys(file_hash),
+            args=[file_hash, owner, state.value, next_attempt_at, error_message],
+        )
+        return state
+
+    def release(self, file_hash: str, owner: str, delay: float) -> None:
+        self._release(
+            keys=self._keys(file_hash),
+            args=[file_hash, owner, time.time() + delay],
+        )
+
+    def delete(self, file_hash: str) -> None:
+        # Иначе повторное добавление того же содержимого вернёт done
+        pipeline = self.client.pipeline()
+        pipeline.delete(self.job_key(file_hash))
+        pipeline.zrem(self.due_key, file_hash)
+        pipeline.zrem(self.leases_key, file_hash)
+        pipeline.execute()
+
+    def recover(self) -> int:
+        return self._recover(
+            keys=[self.due_key, self.leases_key],
+            args=[time.time(), f"{self.prefix}job:"],
+        )
+
+    def publish_status(
+        self, file_hash: str, status: ImageStatus, error_message: str | None = None
+    ) -> None:
+        self.client.lpush(
+            self.statuses_key,
+            json.dumps(
+                {"file_hash": file_hash, "status": status.value, "error": error_message}
+            ),
+        )
+
+    def drain_statuses(self, limit: int = 100) -> list[tuple]:
+        items = self.client.rpop(self.statuses_key, limit) or []
+        statuses = []
+        for item in items:
+            data = json.loads(item)
+            statuses.append(
+                (data["file_hash"], ImageStatus(data["status"]), data["error"])
+            )
+        return statuses
+
+
+def build_job_queue(config: dict, db_manager: DatabaseManager) -> JobQueue:
+    """Очередь по настройке JOB_QUEUE"""
+    if config["JOB_QUEUE"] == "sqlite":
+        return SqliteJobQueue(db_manager)
+
+    if config["JOB_QUEUE"] == "redis":
+        return RedisJobQueue(config["REDIS_URL"])
+
+    raise ValueError(f"Неизвестная очередь задач: {config['JOB_QUEUE']}")
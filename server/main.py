@@ -1,43 +1,82 @@
-import os
+import time
 
-from flask import Flask
-from pathlib import Path
-from dotenv import load_dotenv
-from api.routes import setup_routes
-from utils.logger_setup import setup_logger
+# Отсчёт запуска начинается до тяжёлых импортов
+STARTED_AT = time.perf_counter()
 
+import os  # noqa: E402
+import threading  # noqa: E402
 
-ORIGINALS_PATH = os.getenv("ORIGINALS_PATH")
-OUTPUT_PATH = os.getenv("OUTPUT_PATH")
+from flask import Flask  # noqa: E402
+from pathlib import Path  # noqa: E402
+from config import Config  # noqa: E402
+from utils.logger_setup import setup_logger  # noqa: E402
+from utils.startup import StartupTimer  # noqa: E402
 
-load_dotenv()
 
+def create_app(start_background: bool = True):
+    """start_background - запустить воркеры задач и прогрев. Не нужно
+    в процессе, который не принимает запросы (родитель reloader)"""
+    timer = StartupTimer(STARTED_AT)
+    timer.phases["imports"] = time.perf_counter() - STARTED_AT
 
-class Config:
-    ORIGINALS_PATH = os.getenv("ORIGINALS_PATH")
-    OUTPUT_PATH = os.getenv("OUTPUT_PATH")
-    SERVER_HOST = os.getenv("SERVER_HOST")
-    SERVER_PORT = int(os.getenv("SERVER_PORT", 5001))
-
-
-def create_app():
     app = Flask(__name__)
 
     # Инициализация конфигурации
     app.config.from_object(Config)
 
     # Настройка логгера
-    logger = setup_logger()
+    with timer.phase("logger"):
+        logger = setup_logger()
 
     # Создаем необходимые директории
-    Path(app.config["OUTPUT_PATH"]).mkdir(exist_ok=True)
+    if app.config["STORAGE_BACKEND"] == "local":
+        Path(app.config["OUTPUT_PATH"]).mkdir(exist_ok=True)
+        if app.config["ORIGINALS_PATH"]:
+            Path(app.config["ORIGINALS_PATH"]).mkdir(exist_ok=True)
+
+    # Настройка маршрутов. Модули с Pillow импортируются только здесь
+    with timer.phase("routes"):
+        from api.routes import setup_routes
+        from api.health import setup_health_routes
+        from api.limits import setup_request_limits
+        from api.services import build_services, prewarm
+
+        services = build_services(
+            app.config, logger, defer_backend=not start_background
+        )
+        setup_routes(app, logger, app.config, services)
+        setup_health_routes(app, logger, timer)
+        setup_request_limits(app, logger, app.config)
+
+    if not start_background:
+        return app
+
+    services.job_runner.start(app.config["WORKER_THREADS"])
+
+    def warm_up():
+        # Пока прогрев не удался, /health/ready отвечает 503; повторяем
+        # с растущей задержкой (например, пока недоступна БД)
+        delay = 1
+        while app.config["PREWARM"]:
+            try:
+                prewarm(services, app.config, logger, timer)
+                break
+            except Exception as e:
+                logger.error("Ошибка прогрева: %s, повтор через %s с", e, delay)
+                timer.mark_failed(str(e))
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        timer.mark_ready()
+        logger.info("Сервер готов: %s", timer.report())
 
-    # Настройка маршрутов
-    setup_routes(app, logger, app.config)
+    # Liveness отвечает сразу, readiness - после прогрева
+    threading.Thread(target=warm_up, name="prewarm", daemon=True).start()
 
     return app
 
 
 if __name__ == "__main__":
-    app = create_app()
+    # С debug=True werkzeug запускает reloader: запросы обслуживает дочерний
+    # процесс с WERKZEUG_RUN_MAIN, родитель только следит за файлами
+    app = create_app(start_background=os.environ.get("WERKZEUG_RUN_MAIN") == "true")
     app.run(port=Config.SERVER_PORT, host="0.0.0.0", debug=True)
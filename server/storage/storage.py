@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, cast
+from utils.exceptions import ImageNotFoundError
+
+# До этого размера скачанный из S3 файл держим в памяти
+S3_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+class Storage(ABC):
+    """Хранилище файлов по ключу: локальная папка или S3-совместимый бакет"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool: ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO | Path:
+        """Источник для декодирования: путь к файлу или поток"""
+
+    @abstractmethod
+    def read_bytes(self, key: str) -> bytes: ...
+
+    @abstractmethod
+    def put_file(self, key: str, local_path: Path) -> None:
+        """Атомарное сохранение локального файла под ключом. Файл забирается"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Удаление. False - файла уже не было"""
+
+    @abstractmethod
+    def staging_dir(self) -> Path:
+        """Папка для временных файлов перед put_file"""
+
+
+class LocalStorage(Storage):
+    """Папка на локальном диске. Абсолютные ключи используются как есть"""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def open(self, key: str) -> Path:
+        return self.path(key)
+
+    def read_bytes(self, key: str) -> bytes:
+        return self.path(key).read_bytes()
+
+    def put_file(self, key: str, local_path: Path) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(local_path, path)
+
+    def delete(self, key: str) -> bool:
+        path = self.path(key)
+        if not path.exists():
+            return False
+        path.unlink()
+        return True
+
+    def staging_dir(self) -> Path:
+        # Та же файловая система, чтобы os.replace был атомарным
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root
+
+
+class S3Storage(Storage):
+    """S3-совместимое хранилище (AWS S3, MinIO). Нужен boto3"""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+        access_key: str | None = None,
+        secret_key: str | None = None,
+        region: str | None = None,
+    ):
+        try:
+            import boto3
+        except ImportError:
+            raise ValueError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+        )
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key.lstrip('/')}"
+
+    def _get_body(self, key: str):
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self.object_key(key)
+            )
+        except self.client.exceptions.NoSuchKey:
+            raise ImageNotFoundError(f"Файл {key} не найден в хранилище")
+        return response["Body"]
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def open(self, key: str) -> BinaryIO:
+        spool = tempfile.SpooledTemporaryFile(max_size=S3_SPOOL_SIZE)
+        shutil.copyfileobj(self._get_body(key), spool)
+        spool.seek(0)
+        return cast(BinaryIO, spool)
+
+    def read_bytes(self, key: str) -> bytes:
+        return self._get_body(key).read()
+
+    def put_file(self, key: str, local_path: Path) -> None:
+        # Объект в S3 появляется целиком после завершения загрузки
+        try:
+            self.client.upload_file(str(local_path), self.bucket, self.object_key(key))
+        finally:
+            local_path.unlink(missing_ok=True)
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        return True
+
+    def staging_dir(self) -> Path:
+        return Path(tempfile.gettempdir())
+
+
+def build_storage(
+    backend: str, local_root: str | Path, s3_prefix: str, config: dict
+) -> Storage:
+    """Хранилище по настройке STORAGE_BACKEND"""
+    if backend == "local":
+        return LocalStorage(local_root)
+
+    if backend == "s3":
+        if not config["S3_BUCKET"]:
+            raise ValueError("S3_BUCKET не указан")
+        return S3Storage(
+            config["S3_BUCKET"],
+            prefix=s3_prefix,
+            endpoint_url=config["S3_ENDPOINT_URL"],
+            access_key=config["S3_ACCESS_KEY"],
+            secret_key=config["S3_SECRET_KEY"],
+            region=config["S3_REGION"],
+        )
+
+    raise ValueError(f"Неизвестное хранилище: {backend}")
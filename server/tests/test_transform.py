@@ -0,0 +1,122 @@
+import tempfile
+import unittest
+
+from PIL import Image, ExifTags
+from pathlib import Path
+from api.admission import DecodeAdmission
+from api.backends import EncoderProfile, PillowBackend
+from api.transform import plan_resize
+
+FRAME = (500, 700)
+
+# Обратные операции: из того, что видит пользователь, в пиксели файла
+_INVERSE_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_90,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_270,
+}
+
+QUADRANTS = {
+    "top-left": (255, 0, 0),
+    "top-right": (0, 0, 255),
+    "bottom-left": (0, 255, 0),
+    "bottom-right": (255, 255, 255),
+}
+
+
+def make_displayed(size: tuple[int, int]) -> Image.Image:
+    """Изображение, каким его должен увидеть пользователь: четыре цветные четверти"""
+    width, height = size
+    image = Image.new("RGB", size)
+    image.paste(QUADRANTS["top-left"], (0, 0, width // 2, height // 2))
+    image.paste(QUADRANTS["top-right"], (width // 2, 0, width, height // 2))
+    image.paste(QUADRANTS["bottom-left"], (0, height // 2, width // 2, height))
+    image.paste(QUADRANTS["bottom-right"], (width // 2, height // 2, width, height))
+    return image
+
+
+class PlanResizeTest(unittest.TestCase):
+    SIZES = [(3000, 4000), (4000, 3000), (1600, 1000), (2000, 1500), (1000, 1600)]
+
+    def assert_box_inside(self, size, box):
+        left, top, right, bottom = box
+        self.assertGreaterEqual(left, 0)
+        self.assertGreaterEqual(top, 0)
+        self.assertLessEqual(right, size[0])
+        self.assertLessEqual(bottom, size[1])
+        self.assertLess(left, right)
+        self.assertLess(top, bottom)
+
+    def test_crop_box_stays_inside_source(self):
+        for size in self.SIZES:
+            for frame in (FRAME, FRAME[::-1], (333, 777)):
+                with self.subTest(size=size, frame=frame):
+                    target, box = plan_resize(size, frame, "crop")
+                    self.assertEqual(target, frame)
+                    self.assert_box_inside(size, box)
+                    # Пропорции области совпадают с рамкой
+                    left, top, right, bottom = box
+                    self.assertAlmostEqual(
+                        (right - left) / (bottom - top), frame[0] / frame[1]
+                    )
+
+    def test_crop_takes_center(self):
+        _, box = plan_resize((2000, 1000), (500, 500), "crop")
+        self.assertEqual(box, (500.0, 0.0, 1500.0, 1000.0))
+
+    def test_fit_keeps_proportions(self):
+        target, box = plan_resize((2000, 1000), FRAME, "fit")
+        self.assertEqual(target, (500, 250))
+        self.assertEqual(box, (0.0, 0.0, 2000.0, 1000.0))
+
+    def test_stretch_uses_frame(self):
+        target, box = plan_resize((2000, 1000), FRAME, "stretch")
+        self.assertEqual(target, FRAME)
+        self.assertEqual(box, (0.0, 0.0, 2000.0, 1000.0))
+
+
+class PillowCropOrientationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.backend = PillowBackend(DecodeAdmission())
+
+    def render(self, displayed_size: tuple[int, int], orientation: int) -> Image.Image:
+        image = make_displayed(displayed_size)
+        if orientation in _INVERSE_TRANSPOSE:
+            image = image.transpose(_INVERSE_TRANSPOSE[orientation])
+
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = orientation
+        source = Path(self.tmp_dir.name) / f"source-{orientation}.jpg"
+        image.save(source, "JPEG", quality=95, exif=exif)
+
+        destination = Path(self.tmp_dir.name) / f"result-{orientation}.jpg"
+        self.backend.render(
+            source, destination, FRAME, "crop", EncoderProfile(), strip_metadata=True
+        )
+        return Image.open(destination).convert("RGB")
+
+    def assert_color(self, result: Image.Image, point, quadrant: str):
+        actual = result.getpixel(point)
+        for channel, expected in zip(actual, QUADRANTS[quadrant]):
+            self.assertLess(abs(channel - expected), 40, (quadrant, actual))
+
+    def test_crop_with_every_orientation(self):
+        for displayed_size in [(3000, 4000), (1600, 1000), (2000, 1500)]:
+            for orientation in range(1, 9):
+                with self.subTest(size=displayed_size, orientation=orientation):
+                    result = self.render(displayed_size, orientation)
+                    self.assertEqual(result.size, FRAME)
+                    self.assert_color(result, (100, 100), "top-left")
+                    self.assert_color(result, (400, 100), "top-right")
+                    self.assert_color(result, (100, 600), "bottom-left")
+                    self.assert_color(result, (400, 600), "bottom-right")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 from functools import wraps
 from flask import jsonify
 from logging import Logger
+from werkzeug.exceptions import RequestEntityTooLarge
 from database.database_manager import ImageNotFoundError, DatabaseError
+from utils.exceptions import ImageTooLargeError, ServerBusyError
 
 
 def format_response(success_code: int = 200, logger: Logger | None = None):
@@ -10,7 +12,12 @@ def format_response(success_code: int = 200, logger: Logger | None = None):
         def wrapper(*args, **kwargs):
             try:
                 result = f(*args, **kwargs)
-                logger.info(f"✅ \x1b[4mRequest successful\x1b[0m: {f.__name__}")
+                # Строка на каждый запрос: попадает под LOG_SAMPLE_RATE
+                logger.info(
+                    "✅ Request successful: %s",
+                    f.__name__,
+                    extra={"sampled": True, "highlight": "Request successful"},
+                )
                 return jsonify(result), success_code
             except ImageNotFoundError as e:
                 logger.warning(f"⚠️ Image not found: {e}")
@@ -24,6 +31,43 @@ def format_response(success_code: int = 200, logger: Logger | None = None):
                     ),
                     404,
                 )
+            except ImageTooLargeError as e:
+                logger.warning(f"⚠️ Image too large: {e}")
+                return (
+                    jsonify(
+                        {
+                            "status": "error",
+                            "message": str(e),
+                            "error_type": "image_too_large",
+                        }
+                    ),
+                    413,
+                )
+            except RequestEntityTooLarge as e:
+                # Тело больше MAX_CONTENT_LENGTH, werkzeug отказал до чтения
+                logger.warning(f"⚠️ Image too large: {e.description}")
+                return (
+                    jsonify(
+                        {
+                            "status": "error",
+                            "message": "Файл слишком большой",
+                            "error_type": "image_too_large",
+                        }
+                    ),
+                    413,
+                )
+            except ServerBusyError as e:
+                logger.warning(f"⚠️ Server busy: {e}")
+                return (
+                    jsonify(
+                        {
+                            "status": "error",
+                            "message": str(e),
+                            "error_type": "server_busy",
+                        }
+                    ),
+                    503,
+                )
             except DatabaseError as e:
                 logger.error(f"❌ Database error: {e}")
                 return (
@@ -18,3 +18,17 @@ class DatabaseError(ImageProcessingError):
 
     def __init__(self, message: str):
         super().__init__(message)
+
+
+class ImageTooLargeError(ImageProcessingError):
+    """Изображение больше лимита загрузки или бюджета памяти на декодирование"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class ServerBusyError(ImageProcessingError):
+    """Сервер перегружен, запрос стоит повторить позже"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
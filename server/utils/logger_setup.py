@@ -1,16 +1,184 @@
+import os
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
+import itertools
+import threading
 import colorlog
 
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
 logger: logging.Logger = logging.getLogger(__name__)
 
+_listener: QueueListener | None = None
+_handler: logging.Handler | None = None
+_rate_filter: "RateLimitFilter | None" = None
+_flusher: threading.Thread | None = None
+_flusher_stop = threading.Event()
 
-def setup_logger() -> logging.Logger:
-    """Настройка логгера с цветным выводом"""
-    # Создаём handler
-    handler = colorlog.StreamHandler()
 
-    # Создаём форматтер с цветами
-    formatter = colorlog.ColoredFormatter(
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи в одну строку JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только каждую N-ю запись уровня INFO и ниже из отмеченных
+    extra={"sampled": True}. Остальные записи проходят всегда"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        if self.every == 0:
+            return False
+        return next(self._counter) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в потоке запроса.
+
+    Стандартный prepare вызывает format() (вместе с traceback) и убирает
+    exc_info. Здесь подставляются только аргументы сообщения, а всё
+    форматирование делает handler в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Аргументы могут измениться, пока запись лежит в очереди
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничение количества повторяющихся ошибок за временное окно.
+
+    Одинаковыми считаются ошибки из одного места в коде: сообщения часто
+    собираются f-строкой с путём или текстом ошибки. Окна хранятся в
+    порядке начала, истёкшие удаляются, их не больше max_keys.
+    """
+
+    def __init__(self, burst: int, window: float, max_keys: int = 1000):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # (файл, строка) -> [начало окна, пропущено, отброшено, логгер,
+        # уровень, первое сообщение окна]
+        self._windows: OrderedDict[tuple[str, int], list] = OrderedDict()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Итоги по отброшенным ошибкам не ограничиваются
+        if record.levelno < logging.ERROR or hasattr(record, "suppressed"):
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [
+                    now,
+                    1,
+                    0,
+                    record.name,
+                    record.levelno,
+                    record.getMessage(),
+                ]
+                self._windows.move_to_end(key)
+                while len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+
+            state[2] += 1
+            return False
+
+    def expire(self, force: bool = False) -> list[logging.LogRecord]:
+        """Удаление истёкших окон. Возвращает итоговые записи по окнам,
+        в которых ошибки отбрасывались. force - завершить все окна"""
+        summaries = []
+        now = time.monotonic()
+        with self._lock:
+            while self._windows:
+                key, state = next(iter(self._windows.items()))
+                if not force and now - state[0] < self.window:
+                    break
+                del self._windows[key]
+
+                started, _, suppressed, name, levelno, message = state
+                if not suppressed:
+                    continue
+                summary = logging.LogRecord(
+                    name,
+                    levelno,
+                    key[0],
+                    key[1],
+                    "Ошибка повторилась ещё %s раз за %.0f с: %s",
+                    (suppressed, now - started, message),
+                    None,
+                )
+                summary.suppressed = suppressed
+                summaries.append(summary)
+        return summaries
+
+
+def _report_suppressed(
+    rate_filter: RateLimitFilter, handler: logging.Handler, interval: float
+) -> None:
+    """Фоновый вывод итогов, даже если ошибка больше не повторится"""
+    while not _flusher_stop.wait(interval):
+        for summary in rate_filter.expire():
+            handler.handle(summary)
+
+
+class ColorFormatter(colorlog.ColoredFormatter):
+    """Цветной вывод. Часть сообщения из extra={"highlight": ...}
+    подчёркивается; в JSON сообщение остаётся без escape-кодов"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        highlight = getattr(record, "highlight", None)
+        if highlight:
+            message = message.replace(highlight, f"\x1b[4m{highlight}\x1b[24m", 1)
+        return message
+
+
+def _build_formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+
+    return ColorFormatter(
         fmt="%(asctime)s - %(name)s - %(log_color)s%(levelname)s - %(message)s%(reset)s",
         log_colors={
             "DEBUG": "green",
@@ -23,10 +191,74 @@ def setup_logger() -> logging.Logger:
         style="%",
     )
 
-    handler.setFormatter(formatter)
+
+def stop_logger() -> None:
+    """Вывод итогов по отброшенным ошибкам, сброс очереди логов
+    и остановка фоновых потоков"""
+    global _listener, _flusher, _rate_filter
+    if _flusher is not None:
+        _flusher_stop.set()
+        _flusher.join()
+        _flusher = None
+    if _rate_filter is not None and _handler is not None:
+        for summary in _rate_filter.expire(force=True):
+            _handler.handle(summary)
+        _rate_filter = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logger() -> logging.Logger:
+    """Настройка логгера с цветным или JSON выводом"""
+    global _listener, _handler, _rate_filter, _flusher
+
+    # json - структурированный вывод, color - цветной вывод для разработки
+    log_format = os.getenv("LOG_FORMAT", "color")
+    # Запись в поток идёт из отдельного потока через очередь
+    use_queue = os.getenv("LOG_QUEUE", "1") == "1"
+    # Доля строк об успешных запросах, которые попадут в лог (1.0 - все)
+    sample_rate = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+    # Сколько одинаковых ошибок пропускаем за окно LOG_ERROR_WINDOW секунд
+    error_burst = int(os.getenv("LOG_ERROR_BURST", 5))
+    error_window = float(os.getenv("LOG_ERROR_WINDOW", 60))
+
+    # Создаём handler, который пишет в поток
+    stream_handler = colorlog.StreamHandler()
+    stream_handler.setFormatter(_build_formatter(log_format))
+
+    stop_logger()
+
+    handler: logging.Handler = stream_handler
+    if use_queue:
+        # В потоке запроса запись только кладётся в очередь,
+        # форматирование и запись в stderr делает QueueListener
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        handler = DeferredQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(stop_logger)
+
+    # Фильтры висят на первом handler, отброшенные записи не попадают в очередь
+    if sample_rate < 1:
+        handler.addFilter(SamplingFilter(sample_rate))
+    if error_burst > 0:
+        _rate_filter = RateLimitFilter(error_burst, error_window)
+        handler.addFilter(_rate_filter)
+        _flusher_stop.clear()
+        _flusher = threading.Thread(
+            target=_report_suppressed,
+            args=(_rate_filter, handler, error_window),
+            name="log-suppressed",
+            daemon=True,
+        )
+        _flusher.start()
 
     # Получаем корневой логгер
     logger = logging.getLogger()
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _handler = handler
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
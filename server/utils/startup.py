@@ -0,0 +1,43 @@
+import time
+import threading
+
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Замер времени фаз запуска и флаг готовности к трафику"""
+
+    def __init__(self, started_at: float | None = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.ready = threading.Event()
+        self.ready_after: float | None = None
+        # Последняя ошибка прогрева, пока сервер не готов
+        self.error: str | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def mark_ready(self) -> None:
+        self.ready_after = time.perf_counter() - self.started_at
+        self.error = None
+        self.ready.set()
+
+    def mark_failed(self, error: str) -> None:
+        self.error = error
+
+    def report(self) -> dict:
+        """Фазы запуска в миллисекундах"""
+        return {
+            "phases_ms": {
+                name: round(duration * 1000, 1) for name, duration in self.phases.items()
+            },
+            "ready_after_ms": (
+                round(self.ready_after * 1000, 1) if self.ready_after is not None else None
+            ),
+        }
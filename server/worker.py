@@ -0,0 +1,40 @@
+import signal
+import threading
+
+from config import config_dict
+from utils.logger_setup import setup_logger
+from api.services import build_services
+
+
+def main():
+    """Отдельный воркер ресайза: берёт задачи из общей очереди.
+
+    Для нескольких узлов нужны JOB_QUEUE=redis и STORAGE_BACKEND=s3,
+    тогда воркеры масштабируются независимо от процесса API.
+    """
+    config = config_dict()
+    logger = setup_logger()
+    services = build_services(config, logger, worker=True)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    services.job_runner.start(config["WORKER_THREADS"])
+    logger.info(
+        "Воркер %s запущен, потоков: %s",
+        services.job_runner.owner,
+        config["WORKER_THREADS"],
+    )
+
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+
+    # Задачи в работе дорабатываются, новые не берутся
+    services.job_runner.stop()
+    logger.info("Воркер остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,23 @@
-import os
-import aiohttp
-import base64
-
-from telegram import (
-    Update,
-)
-from dotenv import load_dotenv
-from typing import Callable
-from functools import wraps
-from telegram.ext import (
-    Application,
-    CommandHandler,
-    MessageHandler,
-    ContextTypes,
-    filters,
-)
-from pathlib import Path
+from __future__ import annotations
+
+import time
+
+# Отсчёт запуска начинается до тяжёлых импортов
+STARTED_AT = time.perf_counter()
+
+import os  # noqa: E402
+import aiohttp  # noqa: E402
+import base64  # noqa: E402
+
+from dotenv import load_dotenv  # noqa: E402
+from typing import Callable, TYPE_CHECKING  # noqa: E402
+from functools import wraps  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+# python-telegram-bot импортируется только при запуске бота
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 load_dotenv()
 
@@ -59,11 +61,13 @@ def handle_error(error_message: str = "Произошла ошибка: {error}"
 
 class Config:
     def __init__(self):
-        load_dotenv()
         self.SERVER_PORT = int(os.getenv("SERVER_PORT", 5001))
         self.SERVER_HOST = os.getenv("SERVER_HOST", "http://127.0.0.1")
         self.SERVER_PATH = f"{self.SERVER_HOST}:{self.SERVER_PORT}"
         self.TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+        # Другой Bot API, например фейковый сервер loadtest
+        self.TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL")
+        self.TELEGRAM_BASE_FILE_URL = os.getenv("TELEGRAM_BASE_FILE_URL")
         self.UPLOAD_DIR = Path(os.getenv("ORIGINALS_PATH", "../originals"))
         self.UPLOAD_DIR.mkdir(exist_ok=True)
 
@@ -168,13 +172,32 @@ class ImageBot:
 
     def run(self):
         """Запуск бота"""
-        application = Application.builder().token(self.config.TELEGRAM_TOKEN).build()
+        imports_started = time.perf_counter()
+        from telegram.ext import (
+            Application,
+            CommandHandler,
+            MessageHandler,
+            filters,
+        )
+
+        imports_time = time.perf_counter() - imports_started
+
+        builder = Application.builder().token(self.config.TELEGRAM_TOKEN)
+        if self.config.TELEGRAM_BASE_URL:
+            builder = builder.base_url(self.config.TELEGRAM_BASE_URL)
+        if self.config.TELEGRAM_BASE_FILE_URL:
+            builder = builder.base_file_url(self.config.TELEGRAM_BASE_FILE_URL)
+        application = builder.build()
 
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CommandHandler("random", self.random_command))
         application.add_handler(CommandHandler("delete", self.delete_command))
         application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
 
+        print(
+            f"Бот запущен за {(time.perf_counter() - STARTED_AT) * 1000:.0f} мс "
+            f"(импорт telegram: {imports_time * 1000:.0f} мс)"
+        )
         application.run_polling()
 
 
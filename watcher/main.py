@@ -1,11 +1,17 @@
-import os
-import requests
 import time
 
-from watchdog.observers import Observer
-from pathlib import Path
-from watchdog.events import FileSystemEventHandler
-from dotenv import load_dotenv
+# Отсчёт запуска начинается до тяжёлых импортов
+STARTED_AT = time.perf_counter()
+
+import os  # noqa: E402
+import json  # noqa: E402
+import hashlib  # noqa: E402
+import requests  # noqa: E402
+
+from watchdog.observers import Observer  # noqa: E402
+from pathlib import Path  # noqa: E402
+from watchdog.events import FileSystemEventHandler  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
 
 load_dotenv()
 
@@ -14,6 +20,49 @@ SERVER_HOST = os.getenv("SERVER_HOST")
 
 SERVER_PATH = f"{SERVER_HOST}:{SERVER_PORT}"
 
+# Папка, за которой следим, и папка результатов сервера
+INPUT_PATH = os.getenv("WATCHER_INPUT_PATH", "../input_photos")
+OUTPUT_PATH = os.getenv("WATCHER_OUTPUT_PATH", "../processed_photos")
+
+# Одна сессия на процесс: соединение с сервером переиспользуется
+session = requests.Session()
+
+# Загружать файл на сервер, а не передавать путь. Нужно, когда сервер
+# работает на другой машине или хранит оригиналы в S3
+WATCHER_UPLOAD = os.getenv("WATCHER_UPLOAD", "0") == "1"
+
+# Путь -> hash загруженных файлов. Сервер называет результат по hash,
+# а не по имени файла, поэтому удалить изображение можно только по
+# сохранённому hash. Файл переживает перезапуск watcher
+UPLOADED_HASHES_PATH = Path(
+    os.getenv("WATCHER_UPLOADED_HASHES", "uploaded_hashes.json")
+)
+
+
+def load_uploaded_hashes() -> dict[str, str]:
+    try:
+        return json.loads(UPLOADED_HASHES_PATH.read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"Не удалось прочитать {UPLOADED_HASHES_PATH}: {e}")
+        return {}
+
+
+def save_uploaded_hashes() -> None:
+    # Через временный файл, чтобы не остаться с обрезанным JSON
+    tmp_path = UPLOADED_HASHES_PATH.with_name(UPLOADED_HASHES_PATH.name + ".tmp")
+    tmp_path.write_text(json.dumps(uploaded_hashes, ensure_ascii=False, indent=2))
+    tmp_path.replace(UPLOADED_HASHES_PATH)
+
+
+uploaded_hashes: dict[str, str] = load_uploaded_hashes() if WATCHER_UPLOAD else {}
+
+
+# Сколько раз отправлять запрос, если сервер перегружен (429, 503).
+# Хотя бы один раз запрос отправляется всегда
+RETRY_ATTEMPTS = max(1, int(os.getenv("WATCHER_RETRY_ATTEMPTS", 5)))
+
 
 SUPPORTED_EXTENSIONS = {
     ".jpg",
@@ -23,16 +72,69 @@ SUPPORTED_EXTENSIONS = {
 }
 
 
-def request_processing(image_path):
+def file_md5(path: Path) -> str:
+    """md5 содержимого, как его считает сервер при загрузке"""
+    hasher = hashlib.md5()
+    with open(path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def send_with_retry(send) -> requests.Response:
+    """Повтор запроса, пока сервер отвечает 429 или 503.
+
+    Ждём столько, сколько просит Retry-After, иначе с растущей задержкой
+    """
+    for attempt in range(RETRY_ATTEMPTS - 1):
+        response = send()
+        if response.status_code not in (429, 503):
+            return response
+
+        retry_after = response.headers.get("Retry-After")
+        delay = float(retry_after) if retry_after else 2**attempt
+        print(f"Сервер занят, повтор через {delay:.0f} с")
+        time.sleep(delay)
+
+    # Последняя попытка: ответ возвращается как есть
+    return send()
+
+
+def request_processing(image_path, output_path: Path | None = None):
     """Отправляет изображение на обработку серверу"""
     try:
         absolute_path = Path(image_path).resolve()
 
-        response = requests.post(
-            f"{SERVER_PATH}/images",
-            json={"file_path": str(absolute_path)},
-        )
-        response.raise_for_status()
+        if WATCHER_UPLOAD:
+            # Файл передаётся потоком, без чтения целиком в память
+            with open(absolute_path, "rb") as image_file:
+
+                def upload():
+                    image_file.seek(0)
+                    return session.post(
+                        f"{SERVER_PATH}/images/upload",
+                        params={"filename": absolute_path.name},
+                        data=image_file,
+                    )
+
+                response = send_with_retry(upload)
+            response.raise_for_status()
+
+            file_hash = response.json()["file_hash"]
+            old_hash = uploaded_hashes.get(str(absolute_path))
+            uploaded_hashes[str(absolute_path)] = file_hash
+            save_uploaded_hashes()
+            if old_hash and old_hash != file_hash:
+                # Содержимое файла заменили, старое изображение больше не нужно
+                delete_by_hash(old_hash, output_path)
+        else:
+            response = send_with_retry(
+                lambda: session.post(
+                    f"{SERVER_PATH}/images",
+                    json={"file_path": str(absolute_path)},
+                )
+            )
+            response.raise_for_status()
         print(f"Сервер ответил: {response.json()}")
 
     except requests.exceptions.RequestException as e:
@@ -41,11 +143,33 @@ def request_processing(image_path):
         print(f"Неожиданная ошибка при обработке {image_path.name}: {str(e)}")
 
 
-def request_deletion(image_path: Path):
-    """Отправляет изображение на обработку серверу"""
+def delete_by_hash(file_hash: str, output_path: Path | None = None) -> None:
+    """Удаление загруженного изображения. Результат называется по hash,
+    его удаляем сами, если output папка общая с сервером"""
+    response = session.delete(f"{SERVER_PATH}/images/{file_hash}")
+    # Изображения уже нет на сервере - удалять нечего
+    if response.status_code != 404:
+        response.raise_for_status()
+    if output_path is not None:
+        (output_path / f"{file_hash}.jpg").unlink(missing_ok=True)
+    print("Удалил!")
+
+
+def request_deletion(image_path: Path, output_path: Path | None = None):
+    """Отправляет серверу запрос на удаление изображения"""
     try:
         absolute_path = Path(image_path).resolve()
-        response = requests.get(
+        if WATCHER_UPLOAD:
+            file_hash = uploaded_hashes.get(str(absolute_path))
+            if not file_hash:
+                print(f"{image_path.name} не загружался на сервер, удалять нечего")
+                return
+            delete_by_hash(file_hash, output_path)
+            del uploaded_hashes[str(absolute_path)]
+            save_uploaded_hashes()
+            return
+
+        response = session.get(
             f"{SERVER_PATH}/images/get-image-id",
             params={"file_path": str(absolute_path)},
         )
@@ -63,7 +187,7 @@ def request_deletion(image_path: Path):
 
         print(f"Получил hash фотки: {file_hash}. Буду удалять")
 
-        response = requests.delete(
+        response = session.delete(
             f"{SERVER_PATH}/images/{file_hash}",
         )
         response.raise_for_status()
@@ -100,8 +224,48 @@ def remove_extra_processed_files(input_dir, output_folder):
     return {"to_remove": len(extra_files)}
 
 
+def check_missing_uploads(input_dir, output_folder):
+    """Сверка папки с загруженными файлами по md5 содержимого.
+
+    Результаты сервера называются по hash, поэтому сравнивать имена
+    с output папкой нельзя
+    """
+    output_path = Path(output_folder)
+    input_files = {
+        str(f.resolve()): f
+        for f in Path(input_dir).glob("*")
+        if f.suffix.lower() in SUPPORTED_EXTENSIONS and f.is_file()
+    }
+
+    # Новые и изменённые, пока watcher не работал
+    to_process = [
+        file_path
+        for absolute_path, file_path in input_files.items()
+        if uploaded_hashes.get(absolute_path) != file_md5(file_path)
+    ]
+    # Удалённые, пока watcher не работал
+    to_remove = [path for path in uploaded_hashes if path not in input_files]
+
+    if to_process:
+        print(f"Я нашел {len(to_process)} незагруженных изображений :(")
+        for file_path in to_process:
+            print(f"Пробую загрузить {file_path.name}")
+            request_processing(file_path, output_path)
+    else:
+        print("Все изображения уже загружены ;)")
+
+    for path in to_remove:
+        print(f"Удалю с сервера: {Path(path).name}")
+        request_deletion(Path(path), output_path)
+
+    return {"to_process": len(to_process), "to_remove": len(to_remove)}
+
+
 def check_missing_images(input_dir, output_folder):
     """Проверяет наличие всех изображений из input в output папке"""
+    if WATCHER_UPLOAD:
+        return check_missing_uploads(input_dir, output_folder)
+
     input_path = Path(input_dir)
     output_path = Path(output_folder)
 
@@ -147,23 +311,39 @@ class ImageHandler(FileSystemEventHandler):
         if event.is_directory:
             return
 
-        file_path = Path(event.src_path)
+        self.process(Path(event.src_path))
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            return
+
+        self.delete(Path(event.src_path))
+
+    def on_moved(self, event):
+        # Файл дописали под временным именем и переименовали: on_created
+        # пришёл на временное имя, поэтому изображение - это dest_path
+        if event.is_directory:
+            return
+
+        self.delete(Path(event.src_path))
+        self.process(Path(event.dest_path))
+
+    def process(self, file_path: Path):
         if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            # При загрузке результат называется по hash, имя не сравниваем
             output_file = self.output_path / file_path.name
-            if output_file.exists():
+            if not WATCHER_UPLOAD and output_file.exists():
                 print(
                     f"File {file_path.name} already exists in output folder, skipping"
                 )
                 return
-            file_path = Path(event.src_path)
-            request_processing(file_path)
+            request_processing(file_path, self.output_path)
 
-    def on_deleted(self, event):
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
+    def delete(self, file_path: Path):
         if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            if WATCHER_UPLOAD:
+                request_deletion(file_path, self.output_path)
+                return
 
             output_file = self.output_path / file_path.name
             if output_file.exists():
@@ -171,7 +351,8 @@ class ImageHandler(FileSystemEventHandler):
                     f"Я видел как ты удалил {file_path.name} из input папки. Сейчас удалю и из output папки."
                 )
                 request_deletion(file_path)
-                output_file.unlink()
+                # Сервер удаляет результат сам, если папка у нас общая
+                output_file.unlink(missing_ok=True)
 
 
 def watch_directory(input_folder, output_folder):
@@ -183,6 +364,16 @@ def watch_directory(input_folder, output_folder):
     try:
         print(f"Начато отслеживание папки: {input_folder}")
         print(f"Изображения будут сохраняться в: {output_folder}")
+        print(f"Запуск занял {(time.perf_counter() - STARTED_AT) * 1000:.0f} мс")
+
+        # Догоняем пропущенные файлы уже после старта наблюдателя,
+        # чтобы новые файлы не ждали окончания проверки
+        check_missing_images(input_folder, output_folder)
+        print(
+            f"Проверка пропущенных файлов заняла "
+            f"{(time.perf_counter() - STARTED_AT) * 1000:.0f} мс с запуска"
+        )
+
         while True:
             time.sleep(1)
 
@@ -195,11 +386,10 @@ def watch_directory(input_folder, output_folder):
 
 
 if __name__ == "__main__":
-    input_folder = "../input_photos"
-    output_folder = "../processed_photos"
+    input_folder = INPUT_PATH
+    output_folder = OUTPUT_PATH
 
     os.makedirs(input_folder, exist_ok=True)
     os.makedirs(output_folder, exist_ok=True)
 
-    check_missing_images(input_folder, output_folder)
     watch_directory(input_folder, output_folder)